@@ -0,0 +1,315 @@
+"""
+Deferred changes of GM2M relations, applied in bulk
+"""
+
+import threading
+from collections import OrderedDict
+
+from django.db import connections, transaction
+from django.db.models import Q
+
+from .bulk import BULK_BATCH_SIZE
+
+
+_local = threading.local()
+
+
+def get_current_batch():
+    """
+    Returns the outermost active batch of the current thread, or None
+    """
+    batches = getattr(_local, 'batches', None)
+    if batches:
+        return batches[0]
+    return None
+
+
+class PendingChanges(object):
+    """
+    The pending changes of the relations of a through table in a database:
+    the scopes (filters on the through table) to clear first, then the
+    scopes whose rows are replaced, then the through rows to add or remove
+    """
+
+    def __init__(self, field):
+        self.field = field
+        self.clears = OrderedDict()
+        # {scope: (filter, set of the wanted rows)}, diffed against the
+        # existing rows when applied
+        self.replaces = OrderedDict()
+        # {(source pk, content type id, target pk): True to add the row,
+        #  False to remove it}
+        self.rows = OrderedDict()
+
+    def copy(self):
+        copy = PendingChanges(self.field)
+        copy.clears.update(self.clears)
+        copy.replaces.update((scope, (filter, set(rows)))
+                             for scope, (filter, rows)
+                             in self.replaces.items())
+        copy.rows.update(self.rows)
+        return copy
+
+    def _supersede(self, scope):
+        # the changes of the rows of the scope are superseded
+        for row in [row for row in self.rows if scope.matches(row)]:
+            del self.rows[row]
+        self.clears.pop(scope, None)
+        self.replaces.pop(scope, None)
+
+    def clear(self, scope, filter):
+        self._supersede(scope)
+        for __, wanted in self.replaces.values():
+            wanted.difference_update(
+                [row for row in wanted if scope.matches(row)])
+        self.clears[scope] = filter
+
+    def replace(self, scope, filter, rows):
+        self._supersede(scope)
+        self.replaces[scope] = (filter, set(rows))
+
+
+class Scope(tuple):
+    """
+    The through rows related to a source object (the first element of the
+    rows is its primary key) or a target object (the last two elements of the
+    rows are its content type id and primary key)
+    """
+
+    def __new__(cls, *values):
+        return super(Scope, cls).__new__(cls, values)
+
+    def matches(self, row):
+        if len(self) == 1:
+            return row[0] == self[0]
+        return row[1:] == self
+
+
+class batch(object):
+    """
+    Context manager making the add, remove, set and clear methods of the GM2M
+    related managers record the changes instead of applying them. The changes
+    are coalesced per through table and applied on exit, with grouped DELETE
+    statements and a bulk_create per batch_size rows, in a transaction.
+
+    The related managers reads flush the pending changes of their through
+    table first, and the objects prefetched for the instances are updated
+    when the changes are recorded. The changes are discarded if an exception
+    is raised in the block, along with the objects prefetched for the
+    instances whose relations were changed. Nested batches are part of the
+    outermost one, but the changes recorded in a nested batch that exits with
+    an exception are discarded, unless they have been applied already
+    """
+
+    def __init__(self, batch_size=BULK_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.pending = OrderedDict()
+        # the related managers whose prefetched objects have been updated,
+        # by id
+        self.managers = OrderedDict()
+        # the pending changes when each active nested batch was entered,
+        # and the managers used since
+        self.snapshots = []
+
+    def __enter__(self):
+        batches = getattr(_local, 'batches', None)
+        if batches is None:
+            batches = _local.batches = []
+        if batches:
+            outermost = batches[0]
+            outermost.snapshots.append((
+                OrderedDict((key, pending.copy())
+                            for key, pending in outermost.pending.items()),
+                OrderedDict()
+            ))
+        batches.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _local.batches.pop()
+        if _local.batches:
+            # the changes are kept in the outermost batch, or the ones
+            # recorded in this one are discarded
+            outermost = _local.batches[0]
+            pending, managers = outermost.snapshots.pop()
+            if exc_type is not None:
+                outermost.pending = pending
+                for manager in managers.values():
+                    manager._discard_prefetched()
+            return
+        if exc_type is None:
+            try:
+                self.flush()
+            except Exception:
+                self.discard()
+                raise
+            self.managers.clear()
+        else:
+            self.discard()
+
+    def discard(self):
+        """
+        Discards the pending changes, and the prefetched objects of the
+        instances they were recorded for, which may include objects that
+        have not been added
+        """
+        self.pending.clear()
+        for pending, __ in self.snapshots:
+            pending.clear()
+        for manager in self.managers.values():
+            manager._discard_prefetched()
+        self.managers.clear()
+
+    def _get_pending(self, manager, db):
+        self.managers[id(manager)] = manager
+        for __, managers in self.snapshots:
+            managers[id(manager)] = manager
+        key = (manager.through, db)
+        try:
+            return self.pending[key]
+        except KeyError:
+            pending = self.pending[key] = PendingChanges(manager.field)
+            return pending
+
+    def add(self, manager, db, objs):
+        rows = self._get_pending(manager, db).rows
+        for row in manager._to_rows(objs):
+            rows.pop(row, None)
+            rows[row] = True
+
+    def remove(self, manager, db, objs):
+        rows = self._get_pending(manager, db).rows
+        for row in manager._to_rows(objs):
+            rows.pop(row, None)
+            rows[row] = False
+
+    def clear(self, manager, db):
+        self._get_pending(manager, db).clear(manager._get_scope(),
+                                             manager._to_clear())
+
+    def set(self, manager, db, objs):
+        self._get_pending(manager, db).replace(manager._get_scope(),
+                                               manager._to_clear(),
+                                               manager._to_rows(objs))
+
+    def flush(self, through=None):
+        """
+        Applies the pending changes of the through model ``through``, or of
+        all the through models if not provided
+        """
+        for key in list(self.pending):
+            if through is None or key[0] is through:
+                # the applied changes cannot be discarded anymore
+                for pending, __ in self.snapshots:
+                    pending.pop(key, None)
+                self._apply(key[0], key[1], self.pending.pop(key))
+
+    def _apply(self, through, db, pending):
+        field_names = through._meta._field_names
+        src_attname = through._meta.get_field(field_names['src']).attname
+        ct_attname = through._meta.get_field(field_names['tgt_ct']).attname
+        fk_name = field_names['tgt_fk']
+        manager = through._default_manager.using(db)
+
+        sources = set(row[0] for row in pending.rows)
+        sources.update(scope[0] for scope in pending.clears
+                       if len(scope) == 1)
+        if pending.field.adjacency_cache is not None:
+            # the sources of the cleared target objects are only known
+            # before the rows are deleted
+            for scope, filter in pending.clears.items():
+                if len(scope) > 1:
+                    sources.update(manager.filter(**filter)
+                                   .values_list(src_attname, flat=True))
+
+        with transaction.atomic(using=db, savepoint=False):
+            self._delete(manager, [Q(**filter)
+                                   for filter in pending.clears.values()])
+
+            rows = pending.rows
+            if pending.replaces:
+                rows = self._diff_replaces(manager, pending, src_attname,
+                                           ct_attname, fk_name)
+                sources.update(row[0] for row in rows)
+
+            self._delete(manager, [
+                Q(**{src_attname: src, ct_attname: ct_id, fk_name: fk})
+                for (src, ct_id, fk), add in rows.items() if not add
+            ])
+            to_add = [row for row, add in rows.items() if add]
+
+            if to_add:
+                ignore_conflicts = \
+                    connections[db].features.supports_ignore_conflicts
+                if not ignore_conflicts:
+                    to_add = self._exclude_existing(manager, to_add,
+                                                    src_attname, ct_attname,
+                                                    fk_name)
+                manager.bulk_create(
+                    [through(**{src_attname: src, ct_attname: ct_id,
+                                fk_name: fk})
+                     for src, ct_id, fk in to_add],
+                    batch_size=self.batch_size,
+                    ignore_conflicts=ignore_conflicts
+                )
+
+        pending.field.invalidate_adjacency(sources, db)
+
+    def _delete(self, manager, conditions):
+        for i in range(0, len(conditions), self.batch_size):
+            q = Q()
+            for condition in conditions[i:i + self.batch_size]:
+                q |= condition
+            manager.filter(q).delete()
+
+    def _diff_replaces(self, manager, pending, src_attname, ct_attname,
+                       fk_name):
+        """
+        Returns the rows to add or remove to replace the rows of the scopes
+        of the pending replaces, followed by the pending rows, from the
+        existing rows of these scopes
+        """
+        filters = [filter for filter, __ in pending.replaces.values()]
+        existing = set()
+        for i in range(0, len(filters), self.batch_size):
+            q = Q()
+            for filter in filters[i:i + self.batch_size]:
+                q |= Q(**filter)
+            existing.update(manager.filter(q).values_list(
+                src_attname, ct_attname, fk_name))
+
+        # the replaces are applied in order, then the rows recorded after
+        # them
+        wanted = set(existing)
+        for scope, (__, rows) in pending.replaces.items():
+            wanted.difference_update(
+                [row for row in wanted if scope.matches(row)])
+            wanted.update(rows)
+
+        changes = OrderedDict(
+            (row, False) for row in existing if row not in wanted)
+        changes.update((row, True) for row in wanted if row not in existing)
+        for row, add in pending.rows.items():
+            changes.pop(row, None)
+            changes[row] = add
+        return changes
+
+    def _exclude_existing(self, manager, rows, src_attname, ct_attname,
+                          fk_name):
+        srcs = list(set(row[0] for row in rows))
+        existing = set()
+        for i in range(0, len(srcs), self.batch_size):
+            existing.update(manager.filter(**{
+                src_attname + '__in': srcs[i:i + self.batch_size]
+            }).values_list(src_attname, ct_attname, fk_name))
+        return [row for row in rows if row not in existing]
+
+
+def flush_pending(through):
+    """
+    Applies the pending changes of the through model ``through`` in the
+    current batch, if any
+    """
+    current = get_current_batch()
+    if current is not None:
+        current.flush(through)
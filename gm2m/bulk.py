@@ -0,0 +1,141 @@
+"""
+SQL operations on the through tables of GM2M relations, affecting many
+source objects in single statements
+"""
+
+from itertools import islice
+
+import django
+from django.db import connections, transaction
+from django.db.backends.utils import truncate_name
+
+if django.VERSION >= (4, 1):
+    from django.db.models.constants import OnConflict
+
+
+# default number of sources or relations handled by each query of the bulk
+# operations
+BULK_BATCH_SIZE = 500
+
+
+def get_insert_statement(connection, ignore_conflicts=True):
+    """
+    Returns the (prefix, suffix) pair of an INSERT statement which ignores
+    the rows that would violate a unique constraint, if the database supports
+    it
+    """
+    if not ignore_conflicts \
+    or not connection.features.supports_ignore_conflicts:
+        return connection.ops.insert_statement(), ''
+    if django.VERSION >= (4, 1):
+        return (
+            connection.ops.insert_statement(on_conflict=OnConflict.IGNORE),
+            connection.ops.on_conflict_suffix_sql([], OnConflict.IGNORE,
+                                                  None, None)
+        )
+    return (connection.ops.insert_statement(ignore_conflicts=True),
+            connection.ops.ignore_conflicts_suffix_sql(ignore_conflicts=True))
+
+
+def insert_select(through, queryset, using):
+    """
+    Inserts the rows selected by ``queryset``, a values_list queryset
+    returning (source primary key, content type id, target primary key)
+    tuples, in the through table in a single INSERT ... SELECT statement.
+    As the columns are inserted in the order of the SQL query, where the
+    fields come before the annotations, the queryset must not select fields
+    after annotations.
+    The rows which already exist are ignored. Returns the number of inserted
+    rows
+    """
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    opts = through._meta
+    columns = [opts.get_field(opts._field_names[name]).column
+               for name in ('src', 'tgt_ct', 'tgt_fk')]
+
+    select_sql, params = queryset.query.get_compiler(using).as_sql()
+    prefix, suffix = get_insert_statement(connection)
+    sql = '%s %s (%s) %s %s' % (prefix, qn(opts.db_table),
+                                ', '.join(qn(c) for c in columns),
+                                select_sql, suffix)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return max(cursor.rowcount, 0)
+
+
+def server_side_set(through, filter, rows, using,
+                    batch_size=BULK_BATCH_SIZE):
+    """
+    Replaces the through rows matching ``filter`` (a QuerySet.filter keyword
+    arguments dictionary) by the (source primary key, content type id,
+    target primary key) tuples of the ``rows`` iterable, without retrieving
+    the existing rows. The tuples are loaded by batches of ``batch_size`` in
+    a temporary staging table, then the missing rows are inserted with an
+    INSERT ... SELECT statement and the stale rows are deleted with a
+    DELETE ... NOT EXISTS statement. This must be run in a transaction, the
+    statements using the staging table being run in a savepoint.
+    Returns the numbers of inserted and deleted rows
+    """
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    opts = through._meta
+    fields = [opts.get_field(opts._field_names[name])
+              for name in ('src', 'tgt_ct', 'tgt_fk')]
+    columns = [qn(f.column) for f in fields]
+    table = qn(opts.db_table)
+    staging = qn(truncate_name('%s_staging' % opts.db_table,
+                               connection.ops.max_name_length()))
+
+    # a plain DROP TABLE commits the transaction on MySQL
+    if connection.vendor == 'mysql':
+        drop_sql = 'DROP TEMPORARY TABLE %s' % staging
+    else:
+        drop_sql = 'DROP TABLE %s' % staging
+
+    # the rows match if all their columns are equal
+    match = ' AND '.join('%s.%s = %s.%s' % (staging, c, table, c)
+                         for c in columns)
+
+    with connection.cursor() as cursor:
+        cursor.execute('CREATE TEMPORARY TABLE %s (%s)' % (
+            staging,
+            ', '.join('%s %s' % (c, f.db_type(connection))
+                      for c, f in zip(columns, fields))
+        ))
+        try:
+            # on errors, the savepoint is rolled back before the staging table
+            # is dropped, as some databases (e.g. PostgreSQL) reject any
+            # statement in a transaction that has failed
+            with transaction.atomic(using=using):
+                rows = iter(rows)
+                insert_sql = 'INSERT INTO %s (%s) VALUES (%s)' % (
+                    staging, ', '.join(columns), ', '.join(['%s'] * 3))
+                while True:
+                    batch = list(islice(rows, batch_size))
+                    if not batch:
+                        break
+                    cursor.executemany(insert_sql, batch)
+
+                cursor.execute(
+                    'INSERT INTO %s (%s) SELECT DISTINCT %s FROM %s '
+                    'WHERE NOT EXISTS (SELECT 1 FROM %s WHERE %s)' % (
+                        table, ', '.join(columns),
+                        ', '.join('%s.%s' % (staging, c) for c in columns),
+                        staging, table, match
+                    )
+                )
+                inserted = max(cursor.rowcount, 0)
+
+                deleted = through._default_manager.using(using) \
+                    .filter(**filter) \
+                    .extra(where=['NOT EXISTS (SELECT 1 FROM %s WHERE %s)'
+                                  % (staging, match)]) \
+                    .delete()[0]
+        except Exception:
+            cursor.execute(drop_sql)
+            raise
+        cursor.execute(drop_sql)
+
+    return inserted, deleted
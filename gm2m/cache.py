@@ -0,0 +1,179 @@
+"""
+Caches for the target objects of GM2M relations, keyed by
+(database alias, content type id, primary key)
+"""
+
+import copy
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.core.cache import caches, DEFAULT_CACHE_ALIAS
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+
+class BaseTargetCache(object):
+    """
+    Base class for target objects caches. Subclasses must implement _get_many,
+    _set_many, delete and clear
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, keys):
+        """
+        Returns a {key: object} dictionary of the cached objects among ``keys``
+        and updates the hits and misses counters
+        """
+        keys = list(keys)
+        found = self._get_many(keys)
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def set_many(self, objects):
+        """
+        Caches the objects of the ``objects`` {key: object} dictionary
+        """
+        if objects:
+            self._set_many(objects)
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def _get_many(self, keys):
+        raise NotImplementedError
+
+    def _set_many(self, objects):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class LocMemTargetCache(BaseTargetCache):
+    """
+    In-process LRU cache, holding at most ``max_size`` objects for ``timeout``
+    seconds (None means no expiration)
+    """
+
+    def __init__(self, max_size=1000, timeout=300):
+        super(LocMemTargetCache, self).__init__()
+        self.max_size = max_size
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_many(self, keys):
+        found = {}
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                try:
+                    expires, obj = self._data[key]
+                except KeyError:
+                    continue
+                if expires is not None and expires <= now:
+                    del self._data[key]
+                    continue
+                self._data.move_to_end(key)
+                # copies are returned so that the cached objects are not
+                # altered by the callers
+                found[key] = copy.copy(obj)
+        return found
+
+    def _set_many(self, objects):
+        expires = None
+        if self.timeout is not None:
+            expires = time.monotonic() + self.timeout
+        with self._lock:
+            for key, obj in objects.items():
+                self._data[key] = (expires, copy.copy(obj))
+                self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DjangoTargetCache(BaseTargetCache):
+    """
+    Cache backed by one of the caches of Django's cache framework (see the
+    CACHES setting). ``timeout`` has the same meaning as in Django's cache API.
+
+    The keys include a generation, stored in the cache under the
+    '<key_prefix>:generation' key, so that the entries can be cleared without
+    clearing the whole Django cache
+    """
+
+    def __init__(self, alias=DEFAULT_CACHE_ALIAS, timeout=DEFAULT_TIMEOUT,
+                 key_prefix='gm2m'):
+        super(DjangoTargetCache, self).__init__()
+        self.alias = alias
+        self.timeout = timeout
+        self.key_prefix = key_prefix
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @property
+    def generation_key(self):
+        return '%s:generation' % self.key_prefix
+
+    def get_generation(self):
+        generation = self.cache.get(self.generation_key)
+        if generation is None:
+            # a new generation is used if the previous one has been evicted,
+            # so that its entries are not used again
+            generation = uuid.uuid4().hex
+            if not self.cache.add(self.generation_key, generation,
+                                  timeout=None):
+                generation = self.cache.get(self.generation_key, generation)
+        return generation
+
+    def make_key(self, key, generation=None):
+        if generation is None:
+            generation = self.get_generation()
+        return ':'.join([self.key_prefix, generation] + [str(k) for k in key])
+
+    def _get_many(self, keys):
+        generation = self.get_generation()
+        cache_keys = dict((self.make_key(key, generation), key)
+                          for key in keys)
+        return dict((cache_keys[k], obj) for k, obj
+                    in self.cache.get_many(cache_keys.keys()).items())
+
+    def _set_many(self, objects):
+        generation = self.get_generation()
+        self.cache.set_many(
+            dict((self.make_key(key, generation), obj)
+                 for key, obj in objects.items()),
+            timeout=self.timeout
+        )
+
+    def delete(self, key):
+        self.cache.delete(self.make_key(key))
+
+    def clear(self):
+        """
+        Starts a new generation of keys, the entries of the previous one being
+        left to expire. The other entries of the Django cache are kept
+        """
+        self.cache.set(self.generation_key, uuid.uuid4().hex, timeout=None)
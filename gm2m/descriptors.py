@@ -3,6 +3,17 @@ Generic many-to-many relations descriptors
 """
 
 
+class ManagersCache(dict):
+    """
+    Cache of the related managers of an instance, stored in its state. It is
+    not copied nor pickled along with the instance, as the managers refer to
+    the instance and their classes are dynamically created
+    """
+
+    def __reduce__(self):
+        return self.__class__, ()
+
+
 class GM2MDescriptor(object):
 
     def __init__(self, field):
@@ -11,7 +22,24 @@ class GM2MDescriptor(object):
     def __get__(self, instance, instance_type=None):
         if instance is None:
             return self
-        return self.related_manager_cls(instance)
+
+        # the manager is created once per instance and cached, unless the
+        # instance's primary key changes
+        try:
+            cache = instance._state.gm2m_managers
+        except AttributeError:
+            cache = instance._state.gm2m_managers = ManagersCache()
+
+        manager = cache.get(self)
+        if manager is not None and manager.instance is not instance:
+            # the cache is shared with the instance this one is a (shallow)
+            # copy of
+            cache = instance._state.gm2m_managers = ManagersCache()
+            manager = None
+
+        if manager is None or manager.pk != instance.pk:
+            manager = cache[self] = self.related_manager_cls(instance)
+        return manager
 
     def __set__(self, instance, value):
         if not self.through._meta.auto_created:
@@ -56,6 +84,29 @@ class SourceGM2MDescriptor(GM2MDescriptor):
     def get_related_models(self, include_auto=False):
         return self.field.get_related_models(include_auto)
 
+    def count_references(self, objs, using=None):
+        return self.field.count_references(objs, using)
+
+    def bulk_add(self, sources, *objs):
+        return self.field.bulk_add(sources, *objs)
+
+    def bulk_remove(self, sources, *objs):
+        return self.field.bulk_remove(sources, *objs)
+
+    def bulk_clear(self, sources):
+        return self.field.bulk_clear(sources)
+
+    def bulk_set(self, relations, **kwargs):
+        return self.field.bulk_set(relations, **kwargs)
+
+    @property
+    def target_cache(self):
+        return self.field.target_cache
+
+    @property
+    def adjacency_cache(self):
+        return self.field.adjacency_cache
+
     @property
     def through(self):
         return self.field.remote_field.through
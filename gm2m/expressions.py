@@ -0,0 +1,243 @@
+"""
+Query expressions for the GM2M relations of source and target model
+querysets, compiled into correlated subqueries on the through table
+"""
+
+from collections import defaultdict
+
+from django.db.models import BooleanField, CharField, Count, Exists, \
+    Expression, F, IntegerField, OuterRef, Q, QuerySet, Subquery, TextField, \
+    UUIDField
+from django.core.exceptions import FieldDoesNotExist, FieldError
+from django.db.models.functions import Cast, Coalesce
+
+from .contenttypes import ct as ct_classes, get_content_type
+from .query import GM2MTgtQuerySet, ThroughUUID, get_target_pk_field, \
+    match_through_fk
+from .relations import GM2MUnitRel
+
+
+class GM2MSubquery(Expression):
+    """
+    Base class for the expressions related to the GM2MField ``field_name`` of
+    the queryset's model, only taking into account the target objects of the
+    models in ``models`` (classes or 'app.Model' strings) if provided
+    """
+
+    def __init__(self, field_name, *models):
+        super(GM2MSubquery, self).__init__()
+        self.field_name = field_name
+        self.models = models
+
+    def __repr__(self):
+        return '%s(%s)' % (self.__class__.__name__,
+                           ', '.join([repr(self.field_name)] +
+                                     [repr(m) for m in self.models]))
+
+    def get_through_queryset(self, model):
+        """
+        Returns the queryset of the through rows of the outer queryset's
+        source object
+        """
+        field = model._meta.get_field(self.field_name)
+        through = field.remote_field.through
+
+        qs = GM2MTgtQuerySet(through).filter(**{
+            through._meta._field_names['src']: OuterRef('pk')
+        })
+        if self.models:
+            qs = qs.filter(Model__in=self.models)
+        return qs.order_by()
+
+    def get_expression(self, model):
+        raise NotImplementedError
+
+    def resolve_expression(self, query=None, *args, **kwargs):
+        # the subquery can only be built once the source model is known
+        return self.get_expression(query.model) \
+                   .resolve_expression(query, *args, **kwargs)
+
+
+class GM2MCount(GM2MSubquery):
+    """
+    The number of related objects
+    """
+
+    output_field = IntegerField()
+
+    def get_expression(self, model):
+        qs = self.get_through_queryset(model)
+        src = qs.model._meta._field_names['src']
+        return Coalesce(
+            Subquery(qs.values(src).annotate(_gm2m_count=Count('pk'))
+                       .values('_gm2m_count'),
+                     output_field=IntegerField()),
+            0
+        )
+
+
+class GM2MExists(GM2MSubquery):
+    """
+    True if there is any related object
+    """
+
+    output_field = BooleanField()
+
+    def get_expression(self, model):
+        return Exists(self.get_through_queryset(model))
+
+
+class GM2MContains(GM2MSubquery):
+    """
+    True if any of ``targets`` is a related object. The targets may be model
+    instances, of any model, or querysets of target objects which are then
+    evaluated in subqueries
+    """
+
+    output_field = BooleanField()
+
+    def __init__(self, field_name, *targets):
+        super(GM2MContains, self).__init__(field_name)
+        self.targets = targets
+
+    def __repr__(self):
+        return '%s(%s)' % (self.__class__.__name__,
+                           ', '.join([repr(self.field_name)] +
+                                     [repr(t) for t in self.targets]))
+
+    def get_expression(self, model):
+        qs = self.get_through_queryset(model)
+        field_names = qs.model._meta._field_names
+        ct_name = field_names['tgt_ct']
+        fk_name = field_names['tgt_fk']
+
+        conditions = []
+        pks = defaultdict(lambda: [])
+        for target in self.targets:
+            if isinstance(target, QuerySet):
+                conditions.append((
+                    Q(**{ct_name: get_content_type(target.model)}),
+                    Exists(match_through_fk(target.order_by(),
+                                            OuterRef(fk_name)))
+                ))
+            else:
+                pks[get_content_type(target)].append(target.pk)
+
+        # the instances are grouped per content type
+        for ct, ct_pks in pks.items():
+            conditions.append(
+                (Q(**{ct_name: ct, fk_name + '__in': ct_pks}), None)
+            )
+
+        return Exists(qs._filter_exists(conditions))
+
+
+def prefix_expression(expression, prefix):
+    """
+    Returns a copy of ``expression`` whose F() references are prefixed with
+    ``prefix``. The outer references and subqueries are left unchanged
+    """
+    if isinstance(expression, (OuterRef, Subquery)):
+        return expression
+    if isinstance(expression, F):
+        return F(prefix + '__' + expression.name)
+    if hasattr(expression, 'get_source_expressions'):
+        expression = expression.copy()
+        expression.set_source_expressions([
+            None if source is None else prefix_expression(source, prefix)
+            for source in expression.get_source_expressions()
+        ])
+    return expression
+
+
+def prefix_lookups(q, prefix):
+    """
+    Returns a copy of the Q object ``q`` whose lookups and F() references are
+    prefixed with ``prefix``. Subqueries cannot be used as conditions, as
+    their outer references could not be prefixed
+    """
+    children = []
+    for child in q.children:
+        if isinstance(child, Q):
+            children.append(prefix_lookups(child, prefix))
+        elif isinstance(child, tuple):
+            children.append((prefix + '__' + child[0],
+                             prefix_expression(child[1], prefix)))
+        elif isinstance(child, Subquery):
+            raise ValueError('Subqueries cannot be used as conditions on '
+                             'the source objects, use a lookup instead '
+                             '(e.g. pk__in=...)')
+        else:
+            # a conditional expression
+            children.append(prefix_expression(child, prefix))
+
+    prefixed = Q()
+    prefixed.connector = q.connector
+    prefixed.negated = q.negated
+    prefixed.children = children
+    return prefixed
+
+
+class GM2MSourceExists(Expression):
+    """
+    True if any source object related to the target object through the
+    reverse relation ``query_name`` matches the provided filter arguments
+    (Q objects and lookups on the source model, as for QuerySet.filter).
+
+    Filtering a target model queryset with this expression is equivalent to
+    filtering it with the reverse relation lookups, but it is compiled into a
+    semijoin (an EXISTS subquery on the through table) instead of joins, so
+    that the target objects are not duplicated and no DISTINCT is needed
+    """
+
+    output_field = BooleanField()
+
+    def __init__(self, query_name, *args, **kwargs):
+        super(GM2MSourceExists, self).__init__()
+        self.query_name = query_name
+        self.q = Q(*args, **kwargs)
+
+    def __repr__(self):
+        return '%s(%r, %r)' % (self.__class__.__name__, self.query_name,
+                               self.q)
+
+    def get_expression(self, model):
+        try:
+            rel = model._meta.get_field(self.query_name)
+        except FieldDoesNotExist:
+            rel = None
+        if not isinstance(rel, GM2MUnitRel):
+            raise FieldError('%s has no GM2M reverse relation named %r'
+                             % (model.__name__, self.query_name))
+
+        through = rel.through
+        field_names = through._meta._field_names
+
+        qs = through._base_manager.all()
+        fk_name = field_names['tgt_fk']
+        pk = OuterRef('pk')
+        pk_field = get_target_pk_field(model)
+        if isinstance(pk_field, UUIDField):
+            # the text representation of UUIDs is not always their database
+            # representation, the foreign key is converted instead
+            qs = qs.annotate(_gm2m_tgt_pk=ThroughUUID(fk_name))
+            fk_name = '_gm2m_tgt_pk'
+        elif not isinstance(pk_field, (CharField, TextField)):
+            # the primary key is converted to a string, as it is in the
+            # through table
+            pk = Cast(pk, output_field=CharField())
+
+        ct = ct_classes.ContentType.objects.get_for_model(
+            rel.model, for_concrete_model=rel.for_concrete_model)
+
+        return Exists(
+            qs.filter(
+                prefix_lookups(self.q, field_names['src']),
+                **{field_names['tgt_ct']: ct, fk_name: pk}
+            ).order_by()
+        )
+
+    def resolve_expression(self, query=None, *args, **kwargs):
+        # the subquery can only be built once the target model is known
+        return self.get_expression(query.model) \
+                   .resolve_expression(query, *args, **kwargs)
@@ -1,13 +1,21 @@
 import warnings
+from collections import defaultdict, OrderedDict
 
+from django.db.models import CharField, Count, IntegerField, Q, Value
 from django.db.models.fields import Field
-from django.db import connection
+from django.db.models.fields.related import lazy_related_operation
+from django.db.models.signals import post_save, post_delete
+from django.db import connection, connections, router, transaction
 from django.utils.encoding import force_str
 from django.utils.translation import gettext_lazy as _
 from django.core import checks
 from django.db.backends import utils as db_backends_utils
 
 from .relations import GM2MRel, REL_ATTRS, REL_ATTRS_NAMES
+from .contenttypes import get_content_type
+from .cache import LocMemTargetCache
+from .batch import flush_pending
+from .bulk import insert_select, BULK_BATCH_SIZE
 
 
 class GM2MField(Field):
@@ -50,6 +58,16 @@ class GM2MField(Field):
 
         self.db_table = params.pop('db_table', None)
         self.pk_maxlength = params.pop('pk_maxlength', False)
+
+        # target objects caching, which does not affect the database schema
+        # and is therefore not part of the deconstruction
+        self.cache_targets = params.pop('cache_targets', ())
+        self.target_cache = params.pop('target_cache', None)
+        if self.cache_targets and self.target_cache is None:
+            self.target_cache = LocMemTargetCache()
+        self._cached_models = set()
+        # cache of the sources adjacency lists, same remark as above
+        self.adjacency_cache = params.pop('adjacency_cache', None)
         if self.remote_field.through is not None:
             assert self.db_table is None and self.pk_maxlength is False, \
                 'django-gm2m: Cannot specify a db_table nor a pk_maxlength ' \
@@ -211,6 +229,340 @@ class GM2MField(Field):
         # Set up related classes if relations are defined
         self.remote_field.contribute_to_class(cls)
 
+        if self.cache_targets and not cls._meta.abstract:
+            lazy_related_operation(self._setup_target_cache, cls,
+                                   *self.cache_targets)
+
+        if self.adjacency_cache is not None and not cls._meta.abstract:
+            lazy_related_operation(self._setup_adjacency_cache, cls,
+                                   self.remote_field.through)
+
+    def _setup_target_cache(self, cls, *models):
+        for model in models:
+            self._cached_models.add(model)
+            # the cached objects are invalidated when they are modified
+            for signal in (post_save, post_delete):
+                signal.connect(self._invalidate_target, sender=model,
+                               weak=False,
+                               dispatch_uid='gm2m_target_cache_%i' % id(self))
+
+    def _invalidate_target(self, sender, instance, using=None, **kwargs):
+        # the object may have been cached when read from any database the
+        # router sends the reads to (e.g. a replica), not only from the one
+        # it has been written to
+        ct_id = get_content_type(instance).pk
+        keys = [(alias, ct_id, instance.pk) for alias in connections]
+
+        def delete():
+            for key in keys:
+                self.target_cache.delete(key)
+
+        delete()
+        # the previous version of the object may be cached again before the
+        # change is committed
+        transaction.on_commit(delete, using=using)
+
+    def get_target_cache(self, model):
+        """
+        Returns the target cache if the instances of ``model`` should be
+        cached, or None
+        """
+        if model in self._cached_models:
+            return self.target_cache
+        return None
+
+    def _setup_adjacency_cache(self, cls, through):
+        # the adjacency list of a deleted source is invalidated, as its
+        # primary key may be reused
+        post_delete.connect(self._invalidate_source, sender=cls, weak=False,
+                            dispatch_uid='gm2m_adjacency_cache_%i' % id(self))
+        if not through._meta.auto_created:
+            # the instances of a custom through model are directly created
+            # and deleted, not only from the related managers
+            for signal in (post_save, post_delete):
+                signal.connect(self._invalidate_through, sender=through,
+                               weak=False,
+                               dispatch_uid='gm2m_adjacency_cache_%i'
+                                            % id(self))
+
+    def _invalidate_source(self, sender, instance, using=None, **kwargs):
+        self.invalidate_adjacency((instance.pk,), using)
+
+    def _invalidate_through(self, sender, instance, using=None, **kwargs):
+        src_attname = sender._meta.get_field(
+            sender._meta._field_names['src']).attname
+        self.invalidate_adjacency((getattr(instance, src_attname),), using)
+
+    def get_adjacency_key(self, pk):
+        """
+        Returns the key of the adjacency list of the source with primary key
+        ``pk`` in the adjacency cache
+        """
+        return (self.remote_field.through._meta.db_table, pk)
+
+    def invalidate_adjacency(self, pks, using=None):
+        """
+        Removes the adjacency lists of the sources with primary keys ``pks``
+        from the adjacency cache, if any, after the changes made to the
+        ``using`` database and again when they are committed
+        """
+        if self.adjacency_cache is None:
+            return
+        keys = [self.get_adjacency_key(pk) for pk in set(pks)]
+        if not keys:
+            return
+
+        def delete():
+            for key in keys:
+                self.adjacency_cache.delete(key)
+
+        delete()
+        # the previous adjacency lists may be cached again before the changes
+        # are committed
+        transaction.on_commit(delete, using=using)
+
+    def count_references(self, objs, using=None):
+        """
+        Returns a {target object: number of sources} dictionary for the
+        target objects in ``objs``, with one grouped query per content type
+        """
+        through = self.remote_field.through
+        field_names = through._meta._field_names
+        if using is None:
+            using = router.db_for_read(through)
+        flush_pending(through)
+
+        objs_by_ct = defaultdict(lambda: {})
+        for obj in objs:
+            objs_by_ct[get_content_type(obj)][obj.pk] = obj
+
+        counts = {}
+        for ct, ct_objs in objs_by_ct.items():
+            pk_field = ct.model_class()._meta.pk
+            for obj in ct_objs.values():
+                counts[obj] = 0
+
+            qs = through._base_manager.using(using).filter(**{
+                field_names['tgt_ct']: ct,
+                field_names['tgt_fk'] + '__in': list(ct_objs.keys())
+            })
+            for pk, n in qs.order_by().values_list(field_names['tgt_fk']) \
+                           .annotate(_gm2m_count=Count('pk')):
+                counts[ct_objs[pk_field.to_python(pk)]] = n
+        return counts
+
+    def _check_bulk_through(self, method_name):
+        # as for the related managers, the relations cannot be directly added
+        # or removed if they have an intermediary model
+        opts = self.remote_field.through._meta
+        if not opts.auto_created:
+            raise AttributeError(
+                'Cannot use %s() on a GM2MField which specifies an '
+                'intermediary model. Use %s.%s\'s Manager instead.'
+                % (method_name, opts.app_label, opts.object_name))
+        # the pending changes of a batch are applied first
+        flush_pending(self.remote_field.through)
+
+    def _get_bulk_db(self, sources):
+        """
+        Returns the database the relations of the ``sources`` queryset are
+        written to: the queryset's database if it is bound to one, as the
+        through rows are stored along with the sources, or the router's
+        """
+        if sources._db is not None:
+            return sources._db
+        return router.db_for_write(self.remote_field.through,
+                                   **sources._hints)
+
+    def _get_bulk_sources(self, sources, using):
+        """
+        Returns the primary keys of the ``sources`` queryset if their
+        adjacency lists must be invalidated, or an empty list
+        """
+        if self.adjacency_cache is None:
+            return []
+        return list(sources.using(using).values_list('pk', flat=True))
+
+    def bulk_add(self, sources, *objs):
+        """
+        Adds the target objects ``objs`` to the relations of all the objects
+        of the ``sources`` queryset, with a single INSERT ... SELECT statement
+        (per BULK_BATCH_SIZE target objects) selecting the union of the new
+        relations of each target object, whatever the number of sources.
+        Returns the number of created relations
+        """
+        self._check_bulk_through('bulk_add')
+
+        through = self.remote_field.through
+        field_names = through._meta._field_names
+        fk_field = through._meta.get_field(field_names['tgt_fk'])
+        db = self._get_bulk_db(sources)
+
+        if not sources.query.can_filter():
+            sources = sources.model._base_manager.filter(
+                pk__in=sources.values('pk'))
+        sources = sources.using(db).order_by()
+
+        selects = []
+        for obj in objs:
+            self.add_relation(obj.__class__, auto=True)
+            ct = get_content_type(obj)
+            fk = fk_field.get_prep_value(obj.pk)
+
+            # the sources already related to obj are excluded, rather than
+            # relying on the database ignoring duplicates which is not
+            # supported by all of them
+            existing = through._base_manager.using(db).filter(**{
+                field_names['tgt_ct']: ct,
+                field_names['tgt_fk']: fk
+            }).values(field_names['src'])
+            selects.append(sources.exclude(
+                pk__in=existing
+            ).annotate(
+                _gm2m_ct=Value(ct.pk, output_field=IntegerField()),
+                _gm2m_fk=Value(fk, output_field=CharField())
+            ).values_list('pk', '_gm2m_ct', '_gm2m_fk'))
+
+        added = 0
+        with transaction.atomic(using=db, savepoint=False):
+            # the number of compound SELECT terms is limited on some
+            # databases (e.g. 500 on sqlite)
+            for i in range(0, len(selects), BULK_BATCH_SIZE):
+                batch = selects[i:i + BULK_BATCH_SIZE]
+                added += insert_select(
+                    through, batch[0].union(*batch[1:], all=True), db)
+
+        if added:
+            self.invalidate_adjacency(self._get_bulk_sources(sources, db), db)
+        return added
+
+    def _bulk_delete(self, sources, q=None):
+        through = self.remote_field.through
+        db = self._get_bulk_db(sources)
+        pks = self._get_bulk_sources(sources, db)
+
+        qs = through._default_manager.using(db).filter(**{
+            through._meta._field_names['src'] + '__in':
+                sources.using(db).values('pk')
+        })
+        if q is not None:
+            qs = qs.filter(q)
+        deleted = qs.delete()[0]
+
+        if deleted:
+            self.invalidate_adjacency(pks, db)
+        return deleted
+
+    def bulk_remove(self, sources, *objs):
+        """
+        Removes the target objects ``objs`` from the relations of all the
+        objects of the ``sources`` queryset, with a single DELETE statement.
+        Returns the number of deleted relations
+        """
+        self._check_bulk_through('bulk_remove')
+        if not objs:
+            return 0
+
+        field_names = self.remote_field.through._meta._field_names
+        q = Q()
+        for obj in objs:
+            q |= Q(**{field_names['tgt_ct']: get_content_type(obj),
+                      field_names['tgt_fk']: obj.pk})
+        return self._bulk_delete(sources, q)
+
+    def bulk_clear(self, sources):
+        """
+        Removes all the relations of the objects of the ``sources`` queryset,
+        with a single DELETE statement. Returns the number of deleted
+        relations
+        """
+        self._check_bulk_through('bulk_clear')
+        return self._bulk_delete(sources)
+
+    def bulk_set(self, relations, batch_size=BULK_BATCH_SIZE):
+        """
+        Replaces the related objects of several source objects, ``relations``
+        being a {source object: iterable of target objects} dictionary. The
+        existing relations are read in one query per ``batch_size`` sources,
+        and the differences are applied with one DELETE per ``batch_size``
+        removed relations and a single bulk_create, in a transaction. The
+        sources are grouped by the database the router writes their
+        relations to, each database being updated in its own transaction.
+        Returns the numbers of created and deleted relations
+        """
+        self._check_bulk_through('bulk_set')
+
+        through = self.remote_field.through
+        fk_field = through._meta.get_field(
+            through._meta._field_names['tgt_fk'])
+
+        relations = dict((source, tuple(objs))
+                         for source, objs in relations.items())
+
+        # the wanted relations, as {database: {source pk: {(ct id, fk):
+        # None}}} dictionaries keeping the order of the target objects
+        wanted = OrderedDict()
+        for source, objs in relations.items():
+            db = router.db_for_write(through, instance=source)
+            keys = wanted.setdefault(db, {}) \
+                         .setdefault(source.pk, OrderedDict())
+            for obj in objs:
+                keys[(get_content_type(obj).pk,
+                      fk_field.get_prep_value(obj.pk))] = None
+
+        for model in set(obj.__class__ for objs in relations.values()
+                         for obj in objs):
+            self.add_relation(model, auto=True)
+
+        added = deleted = 0
+        for db, db_wanted in wanted.items():
+            db_added, db_deleted = self._bulk_set(db_wanted, db, batch_size)
+            added += db_added
+            deleted += db_deleted
+
+        for source, objs in relations.items():
+            getattr(source, self.name)._update_prefetched(add=objs,
+                                                          replace=True)
+        return added, deleted
+
+    def _bulk_set(self, wanted, db, batch_size):
+        through = self.remote_field.through
+        field_names = through._meta._field_names
+        src_attname = through._meta.get_field(field_names['src']).attname
+        ct_attname = through._meta.get_field(field_names['tgt_ct']).attname
+
+        src_pks = list(wanted)
+        with transaction.atomic(using=db, savepoint=False):
+            to_delete = []
+            for i in range(0, len(src_pks), batch_size):
+                for pk, src, ct_id, fk in through._base_manager.using(db) \
+                        .filter(**{field_names['src'] + '__in':
+                                   src_pks[i:i + batch_size]}) \
+                        .values_list('pk', src_attname, ct_attname,
+                                     field_names['tgt_fk']):
+                    try:
+                        del wanted[src][(ct_id, fk)]
+                    except KeyError:
+                        # the relation is not wanted anymore
+                        to_delete.append(pk)
+
+            deleted = 0
+            for i in range(0, len(to_delete), batch_size):
+                deleted += through._default_manager.using(db).filter(
+                    pk__in=to_delete[i:i + batch_size]).delete()[0]
+
+            # the remaining wanted relations are the ones to create
+            to_add = [
+                through(**{src_attname: src, ct_attname: ct_id,
+                           field_names['tgt_fk']: fk})
+                for src, keys in wanted.items() for ct_id, fk in keys
+            ]
+            through._default_manager.using(db).bulk_create(
+                to_add, batch_size=batch_size)
+
+        self.invalidate_adjacency(src_pks, db)
+        return len(to_add), deleted
+
     def get_attname_column(self):
         """
         A GM2M field will not have a column as it defines a relation between
@@ -1,9 +1,13 @@
+from collections import defaultdict
+
 import django
-from django.db import router
-from django.db.models import Q, Manager
+from django.db import router, transaction
+from django.db.models import Exists, F, Manager, OuterRef, Q, Value
 from django.db import connections
 
 from .contenttypes import ct, get_content_type
+from .batch import get_current_batch, flush_pending, Scope
+from .bulk import insert_select, server_side_set
 from .query import GM2MTgtQuerySet
 
 
@@ -23,23 +27,44 @@ class GM2MBaseManager(Manager):
             return self.instance \
                        ._prefetched_objects_cache[self.prefetch_cache_name]
         except (AttributeError, KeyError):
+            # the pending changes of a batch must be visible
+            flush_pending(self.through)
             db = self._db or router.db_for_read(self.instance.__class__,
                                                 instance=self.instance)
-            return self._get_queryset(using=db)._next_is_sticky() \
-                       .filter(**self.core_filters)
+            queryset = self._get_queryset(using=db)
+            # the instance hint is used to route the target objects queries
+            queryset._add_hints(instance=self.instance)
+            return queryset._next_is_sticky().filter(**self.core_filters)
 
     def _get_queryset(self, using):
         return super(GM2MBaseManager, self).get_queryset().using(using)
 
     def get_prefetch_queryset(self, instances, queryset=None):
-        db = self._db or router.db_for_read(self.model,
-                                            instance=instances[0])
-
-        if queryset is None:
-            queryset = self._get_queryset(db)
-
-        qs, rel_obj_attr, instance_attr = \
-            self._get_prefetch_queryset_params(instances, queryset, db)
+        flush_pending(self.through)
+
+        # the through table may be partitioned across several databases, so
+        # the instances are grouped by the database the router picks for them
+        # and the prefetch queries are run on each of these databases
+        shards = defaultdict(lambda: [])
+        for instance in instances:
+            db = self._db or router.db_for_read(self.model, instance=instance)
+            shards[db].append(instance)
+
+        querysets = []
+        for db, shard_instances in shards.items():
+            if queryset is None:
+                shard_queryset = self._get_queryset(db)
+            else:
+                shard_queryset = queryset._chain()
+            shard_queryset._add_hints(instance=shard_instances[0])
+
+            qs, rel_obj_attr, instance_attr = \
+                self._get_prefetch_queryset_params(shard_instances,
+                                                   shard_queryset, db)
+            querysets.append(qs)
+
+        if len(querysets) > 1:
+            qs = self._merge_prefetch_querysets(querysets)
 
         return (qs,
                 rel_obj_attr,
@@ -48,6 +73,25 @@ class GM2MBaseManager(Manager):
                 self.prefetch_cache_name,
                 False)
 
+    def _merge_prefetch_querysets(self, querysets):
+        """
+        Evaluates the prefetch querysets of all the databases and returns a
+        queryset holding all the results
+        """
+        lookups = querysets[0]._prefetch_related_lookups
+        objs = []
+        for qs in querysets:
+            # additional lookups are handled by prefetch_related_objects,
+            # on the merged queryset
+            qs._prefetch_related_lookups = ()
+            objs.extend(qs)
+
+        merged = querysets[0]._chain()
+        merged._result_cache = objs
+        merged._prefetch_related_lookups = lookups
+        merged._prefetch_done = True
+        return merged
+
     def _get_extra_queryset(self, queryset, q, extra_fields, db):
         join_table = self.through._meta.db_table
         connection = connections[db]
@@ -88,7 +132,14 @@ class GM2MBaseManager(Manager):
             return
 
         db = router.db_for_write(self.through, instance=self.instance)
-        self._do_add(db, self._to_add(objs, db))
+        current_batch = get_current_batch()
+        if current_batch is not None:
+            current_batch.add(self, db, objs)
+        else:
+            self._do_add(db, self._to_add(objs, db))
+            self.field.invalidate_adjacency(self._affected_sources(db, objs),
+                                            db)
+        self._update_prefetched(add=objs)
 
     add.alters_data = True
 
@@ -110,7 +161,14 @@ class GM2MBaseManager(Manager):
             return
 
         db = router.db_for_write(self.through, instance=self.instance)
-        self._do_remove(db, self._to_remove(objs))
+        current_batch = get_current_batch()
+        if current_batch is not None:
+            current_batch.remove(self, db, objs)
+        else:
+            self._do_remove(db, self._to_remove(objs))
+            self.field.invalidate_adjacency(self._affected_sources(db, objs),
+                                            db)
+        self._update_prefetched(remove=objs)
     remove.alters_data = True
 
     def _do_clear(self, db, filter=None):
@@ -124,28 +182,129 @@ class GM2MBaseManager(Manager):
 
         self._check_through_model('set')
 
-        objs = tuple(objs)
-
         clear = kwargs.pop('clear', False)
+        server_side = kwargs.pop('server_side', False)
         db = router.db_for_write(self.through, instance=self.instance)
+        current_batch = get_current_batch()
+
+        if server_side and current_batch is None:
+            self._server_side_set(db, objs, clear)
+            return
+
+        objs = tuple(objs)
+
+        if current_batch is not None:
+            # the replace is diffed against the existing relations when
+            # applied. A server-side set is recorded as any other, so that it
+            # is discarded along with the batch
+            current_batch.set(self, db, objs)
+            self._update_prefetched(add=objs, replace=True)
+            return
+
+        sources = self._affected_sources(db)
 
         if clear:
             # clears all and re-adds
-            self._do_clear(db)
-            self._do_add(db, *objs)
+            self._do_clear(db, self._to_clear())
+            self._do_add(db, self._to_add(objs, db))
         else:
             # just removes the necessary items and adds the missing ones
             to_add, to_remove = self._to_change(objs, db)
             self._do_remove(db, to_remove)
             self._do_add(db, to_add)
+
+        self.field.invalidate_adjacency(
+            sources + self._affected_sources(db, objs), db)
+        self._update_prefetched(add=objs, replace=True)
     set.alters_data = True
 
+    def _server_side_set(self, db, objs, clear=False):
+        """
+        Replaces the set of related objects by the items in the objs iterable
+        in the database, without retrieving the existing relations nor
+        keeping objs in memory
+        """
+        sources = self._affected_sources(db)
+        with transaction.atomic(using=db, savepoint=False):
+            if clear:
+                self._do_clear(db, self._to_clear())
+            server_side_set(self.through, self._to_clear(),
+                            self._to_rows(objs), db)
+        self.field.invalidate_adjacency(sources + self._affected_sources(db),
+                                        db)
+        # the new related objects have not been kept
+        self._discard_prefetched()
+
     def clear(self):
         db = router.db_for_write(self.through, instance=self.instance)
+
+        current_batch = get_current_batch()
+        if current_batch is not None:
+            current_batch.clear(self, db)
+            self._update_prefetched(replace=True)
+            return
+
+        sources = self._affected_sources(db)
         self._do_clear(db, self._to_clear())
+        self.field.invalidate_adjacency(sources, db)
+        self._update_prefetched(replace=True)
 
     clear.alters_data = True
 
+    def _update_prefetched(self, add=(), remove=(), replace=False):
+        """
+        Updates the prefetched objects list, if any, from the objects that
+        have just been added or removed, so that it does not have to be
+        retrieved again. If replace is True, the objects which are not in add
+        are removed from the list
+        """
+        try:
+            objs = self.instance \
+                       ._prefetched_objects_cache[self.prefetch_cache_name] \
+                       ._result_cache
+        except (AttributeError, KeyError):
+            return
+        if objs is None:
+            return
+
+        get_key = lambda obj: (get_content_type(obj).pk, obj.pk)
+
+        if replace:
+            kept = set(get_key(obj) for obj in add)
+            objs[:] = [obj for obj in objs if get_key(obj) in kept]
+        else:
+            removed = set(get_key(obj) for obj in remove)
+            objs[:] = [obj for obj in objs if get_key(obj) not in removed]
+
+        present = set(get_key(obj) for obj in objs)
+        for obj in add:
+            key = get_key(obj)
+            if key not in present:
+                objs.append(obj)
+                present.add(key)
+
+    def _discard_prefetched(self):
+        """
+        Discards the prefetched objects list, if any, when it cannot be
+        updated
+        """
+        try:
+            del self.instance \
+                    ._prefetched_objects_cache[self.prefetch_cache_name]
+        except (AttributeError, KeyError):
+            pass
+
+    def _affected_sources(self, db, objs=None):
+        """
+        Returns the primary keys of the sources whose adjacency lists are
+        affected by a change of the relations with objs (or with all the
+        related objects if objs is None), or an empty list if the adjacency
+        lists are not cached
+        """
+        if self.field.adjacency_cache is None:
+            return []
+        return self._get_sources(db, objs)
+
 
 class GM2MBaseSrcManager(Manager):
     
@@ -269,7 +428,11 @@ class GM2MBaseSrcManager(Manager):
         for v in vals:
             to_remove.add(v)
         
-        return to_add, Q(pk__in=to_remove)
+        return to_add, Q(**{
+            '%s_id__in' % self.field_names['src']: to_remove,
+            self.field_names['tgt_ct']: inst_ct,
+            self.field_names['tgt_fk']: self.pk
+        })
 
     def _to_clear(self):
         return {
@@ -277,8 +440,29 @@ class GM2MBaseSrcManager(Manager):
             self.field_names['tgt_fk']: self.instance.pk
         }
 
+    def _get_scope(self):
+        return Scope(get_content_type(self.instance).pk,
+                     self.through._meta.get_field(self.field_names['tgt_fk'])
+                         .get_prep_value(self.pk))
+
+    def _to_rows(self, objs):
+        inst_ct = get_content_type(self.instance).pk
+        fk = self.through._meta.get_field(self.field_names['tgt_fk']) \
+                 .get_prep_value(self.pk)
+        for obj in objs:
+            yield obj.pk, inst_ct, fk
+
+    def _get_sources(self, db, objs=None):
+        if objs is not None:
+            return [obj.pk for obj in objs]
+        return list(self.through._default_manager.using(db)
+                        .filter(**self._to_clear())
+                        .values_list(self.field_names['src'], flat=True))
 
-class GM2MBaseTgtManager(Manager):
+
+class GM2MBaseTgtManager(Manager.from_queryset(GM2MTgtQuerySet)):
+    # building the base class from GM2MTgtQuerySet makes its specific methods
+    # (e.g. parallel) available from the manager
 
     def __init__(self, instance):
         # the manager's model is the through model
@@ -292,6 +476,14 @@ class GM2MBaseTgtManager(Manager):
             self.core_filters[key] = getattr(self.instance,
                                              rh_field.attname)
 
+    def get_queryset(self):
+        queryset = super(GM2MBaseTgtManager, self).get_queryset()
+        cache = self.field.adjacency_cache
+        if cache is not None and queryset._result_cache is None:
+            queryset._adjacency = (cache,
+                                   self.field.get_adjacency_key(self.pk))
+        return queryset
+
     def _get_queryset(self, using):
         return GM2MTgtQuerySet(self.model, using=using)
 
@@ -380,6 +572,100 @@ class GM2MBaseTgtManager(Manager):
             '%s_id' % self.field_names['src']: self.pk
         }
 
+    def _get_scope(self):
+        return Scope(self.pk)
+
+    def _to_rows(self, objs):
+        fk_field = self.through._meta.get_field(self.field_names['tgt_fk'])
+        models = set()
+        for obj in objs:
+            if obj.__class__ not in models:
+                # call field.add_relation for each model
+                models.add(obj.__class__)
+                self.field.add_relation(obj.__class__, auto=True)
+            yield (self.pk, get_content_type(obj).pk,
+                   fk_field.get_prep_value(obj.pk))
+
+    def _get_sources(self, db, objs=None):
+        return [self.pk]
+
+    def _copy_from(self, db, src_pks):
+        """
+        Inserts the through rows of the sources with primary keys src_pks
+        into the relations of the instance, with a single INSERT ... SELECT
+        statement skipping the rows the instance already has
+        """
+        opts = self.through._meta
+        src_field = opts.get_field(self.field_names['src'])
+        ct_attname = opts.get_field(self.field_names['tgt_ct']).attname
+        fk_name = self.field_names['tgt_fk']
+        base_mngr = self.through._base_manager.using(db)
+
+        existing = Exists(base_mngr.filter(**{
+            src_field.attname: self.pk,
+            ct_attname: OuterRef(ct_attname),
+            fk_name: OuterRef(fk_name)
+        }))
+        qs = base_mngr.filter(**{src_field.attname + '__in': src_pks})
+        if django.VERSION >= (3, 0):
+            qs = qs.filter(~existing)
+        else:
+            # Exists expressions cannot be used as filters before Django 3.0
+            qs = qs.annotate(_gm2m_existing=existing) \
+                   .filter(_gm2m_existing=False)
+
+        # only annotations are selected, as the fields would be selected
+        # before them whatever the values_list order
+        return insert_select(self.through, qs.annotate(
+            _gm2m_src=Value(self.pk, output_field=src_field.target_field),
+            _gm2m_ct=F(ct_attname),
+            _gm2m_fk=F(fk_name)
+        ).order_by().values_list('_gm2m_src', '_gm2m_ct', '_gm2m_fk')
+                      .distinct(), db)
+
+    def copy_from(self, *sources):
+        """
+        Adds the related objects of the ``sources`` instances (of the source
+        model) to the instance's, in the database only, so that the target
+        objects are not retrieved. Returns the number of created relations
+        """
+        return self._transfer_from(sources, 'copy_from', move=False)
+    copy_from.alters_data = True
+
+    def move_from(self, *sources):
+        """
+        Same as copy_from, but the relations of the sources are removed, so
+        that the instance takes them over (e.g. when merging duplicates)
+        """
+        return self._transfer_from(sources, 'move_from', move=True)
+    move_from.alters_data = True
+
+    def _transfer_from(self, sources, method_name, move):
+        self._check_through_model(method_name)
+        flush_pending(self.through)
+
+        src_pks = [source.pk for source in sources if source.pk != self.pk]
+        if not src_pks:
+            return 0
+
+        db = router.db_for_write(self.through, instance=self.instance)
+        with transaction.atomic(using=db, savepoint=False):
+            added = self._copy_from(db, src_pks)
+            if move:
+                self._do_clear(db, {
+                    '%s_id__in' % self.field_names['src']: src_pks
+                })
+
+        self.field.invalidate_adjacency(
+            [self.pk] + (src_pks if move else []), db)
+        self._discard_prefetched()
+        if move:
+            for source in sources:
+                if source.pk != self.pk:
+                    getattr(source, self.field.name) \
+                        ._update_prefetched(replace=True)
+        return added
+
     def _to_change(self, objs, db):
         """
         Returns the sets of items to be added and a Q object for removal
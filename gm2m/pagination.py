@@ -0,0 +1,281 @@
+"""
+Keyset (cursor) pagination of GM2M relations
+"""
+
+import base64
+import binascii
+import collections.abc
+import json
+from math import ceil
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, InvalidPage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import Http404
+from django.utils.functional import cached_property
+
+from .contenttypes import ct as ct_classes
+from .query import GM2MRef, resolve_refs
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+class GM2MCursorPaginator(object):
+    """
+    Paginates the target objects of a GM2M relation (a queryset returned by a
+    GM2MField related manager) using the through rows (ordering field,
+    content type, primary key) values as keys, rather than offsets. A page is
+    retrieved in one query on the through table, plus one query per content
+    type to resolve the page's objects, however deep the page is.
+
+    The pages are identified by opaque cursors instead of numbers, and
+    ``ordering`` must be a through model field whose values are not null.
+    ``orphans`` is accepted for compatibility with Django's Paginator, but
+    ignored
+    """
+
+    def __init__(self, queryset, per_page, orphans=0,
+                 allow_empty_first_page=True, ordering='pk'):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.allow_empty_first_page = allow_empty_first_page
+        self.reverse = ordering.startswith('-')
+
+        opts = queryset.model._meta
+        self.fields = (ordering.lstrip('-'),
+                       opts._field_names['tgt_ct'],
+                       opts._field_names['tgt_fk'])
+        self.model_fields = [opts.pk if name == 'pk' else opts.get_field(name)
+                             for name in self.fields]
+
+    @cached_property
+    def count(self):
+        """
+        The number of through rows
+        """
+        return self.queryset.count()
+
+    @property
+    def num_pages(self):
+        return max(1, int(ceil(self.count / float(self.per_page))))
+
+    def get_page(self, cursor=None):
+        """
+        Returns the page following (or preceding) ``cursor``, or the first
+        page if the cursor is invalid
+        """
+        try:
+            return self.page(cursor)
+        except InvalidCursor:
+            return self.page()
+
+    def page(self, cursor=None):
+        """
+        Returns the page following (or preceding) ``cursor``, or the first
+        page if cursor is not provided (or is 1, for compatibility with
+        page numbers)
+        """
+        if cursor in (None, '', 1, '1'):
+            cursor = 1
+            before, key = False, None
+        else:
+            before, key = self.decode_cursor(cursor)
+
+        # when paginating backwards, the rows preceding the key are retrieved
+        # in the reverse order
+        desc = before != self.reverse
+        qs = self.queryset.order_by(*[('-' if desc else '') + f
+                                      for f in self.fields])
+        if key is not None:
+            qs = qs.filter(self._get_keyset_q(key, 'lt' if desc else 'gt'))
+
+        rows = list(qs.values_list(*self.fields)[:self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if before:
+            rows.reverse()
+
+        if key is None and not rows and not self.allow_empty_first_page:
+            raise EmptyPage('That page contains no results')
+
+        has_next = key is not None if before else more
+        has_previous = more if before else key is not None
+
+        return GM2MCursorPage(
+            self._resolve(rows), self, cursor, rows,
+            next_cursor=self.encode_cursor(False, rows[-1])
+                        if rows and has_next else None,
+            previous_cursor=self.encode_cursor(True, rows[0])
+                            if rows and has_previous else None
+        )
+
+    def _get_keyset_q(self, key, lookup):
+        """
+        Returns a Q object selecting the rows after (lookup='gt') or before
+        (lookup='lt') key, in the (ordering field, content type, primary key)
+        order
+        """
+        q = Q()
+        for i, field in enumerate(self.fields):
+            conditions = dict(zip(self.fields[:i], key[:i]))
+            conditions['%s__%s' % (field, lookup)] = key[i]
+            q |= Q(**conditions)
+        return q
+
+    def count_before(self, key):
+        """
+        Returns the number of rows preceding ``key``
+        """
+        return self.queryset.filter(
+            self._get_keyset_q(key, 'gt' if self.reverse else 'lt')
+        ).count()
+
+    def _resolve(self, rows):
+        pk_fields = {}
+        refs = []
+        for __, ct, pk in rows:
+            try:
+                pk_field = pk_fields[ct]
+            except KeyError:
+                pk_field = pk_fields[ct] = ct_classes.ContentType.objects \
+                    .get_for_id(ct).model_class()._meta.pk
+            refs.append(GM2MRef(ct, pk_field.to_python(pk)))
+        return resolve_refs(refs, **self.queryset._hints)
+
+    def encode_cursor(self, before, key):
+        data = json.dumps([before] + list(key), cls=DjangoJSONEncoder)
+        return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, cursor):
+        """
+        Returns the (before, key) pair encoded in ``cursor``, the key values
+        being converted to the Python values of the fields. Raises
+        InvalidCursor if the cursor cannot be decoded or if its values do not
+        match the fields
+        """
+        try:
+            data = json.loads(base64.urlsafe_b64decode(
+                cursor.encode('ascii')
+            ).decode('utf-8'))
+            if not isinstance(data, list) \
+            or len(data) != len(self.fields) + 1 \
+            or None in data:
+                raise InvalidCursor('Invalid cursor')
+            before = data[0]
+            key = tuple(field.to_python(value)
+                        for field, value in zip(self.model_fields, data[1:]))
+            for field, value in zip(self.model_fields, key):
+                # also rejects the values which cannot be used in a lookup
+                field.get_prep_value(value)
+        except (AttributeError, TypeError, ValueError, binascii.Error,
+                ValidationError):
+            raise InvalidCursor('Invalid cursor')
+        if not isinstance(before, bool) or None in key:
+            raise InvalidCursor('Invalid cursor')
+        return before, key
+
+
+class GM2MCursorPage(collections.abc.Sequence):
+    """
+    A page of target objects, with the same interface as Django's Page,
+    except that number, next_page_number and previous_page_number are
+    cursors. Objects that do not exist anymore are skipped, so a page may
+    contain less than per_page objects
+    """
+
+    def __init__(self, object_list, paginator, number=1, keys=(),
+                 next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        # the cursor the page was retrieved with
+        self.number = number
+        # the keys of the page's through rows
+        self.keys = keys
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<GM2MCursorPage of %i objects>' % len(self)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def next_page_number(self):
+        if self.next_cursor is None:
+            raise EmptyPage('That page contains no results')
+        return self.next_cursor
+
+    def previous_page_number(self):
+        if self.previous_cursor is None:
+            raise EmptyPage('That page contains no results')
+        return self.previous_cursor
+
+    @cached_property
+    def _start_index(self):
+        if not self.keys:
+            return 0
+        return self.paginator.count_before(self.keys[0]) + 1
+
+    def start_index(self):
+        """
+        Returns the 1-based index of the first row of the page, counting the
+        preceding rows in one query
+        """
+        return self._start_index
+
+    def end_index(self):
+        """
+        Returns the 1-based index of the last row of the page
+        """
+        if not self.keys:
+            return 0
+        return self._start_index + len(self.keys) - 1
+
+
+class GM2MCursorPaginationMixin(object):
+    """
+    A MultipleObjectMixin (e.g. ListView) mixin paginating the queryset with
+    a GM2MCursorPaginator. The cursors are passed as the page parameter
+    rather than page numbers, and ``pagination_ordering`` is the paginator's
+    ordering
+    """
+
+    paginator_class = GM2MCursorPaginator
+    pagination_ordering = 'pk'
+
+    def get_paginator(self, queryset, per_page, orphans=0,
+                      allow_empty_first_page=True, **kwargs):
+        kwargs.setdefault('ordering', self.pagination_ordering)
+        return super(GM2MCursorPaginationMixin, self).get_paginator(
+            queryset, per_page, orphans=orphans,
+            allow_empty_first_page=allow_empty_first_page, **kwargs
+        )
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = self.get_paginator(
+            queryset, page_size, orphans=self.get_paginate_orphans(),
+            allow_empty_first_page=self.get_allow_empty()
+        )
+        page_kwarg = self.page_kwarg
+        cursor = self.kwargs.get(page_kwarg) \
+            or self.request.GET.get(page_kwarg)
+        try:
+            page = paginator.page(cursor)
+        except InvalidPage as e:
+            raise Http404('Invalid page (%s): %s' % (cursor, e))
+        return paginator, page, page.object_list, page.has_other_pages()
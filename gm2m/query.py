@@ -1,10 +1,258 @@
-from collections import defaultdict
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 
-from django.db.models.query import ModelIterable, QuerySet
+import django
+from django.conf import settings
+from django.db import connections, router, transaction, NotSupportedError
+from django.core.exceptions import FieldDoesNotExist, FieldError
+from django.db.models import CharField, IntegerField, TextField, Exists, \
+    OuterRef, Q, F, Case, When, Subquery, Window, Count, Func, UUIDField, \
+    Value
+from django.db.models.functions import Cast, Replace, RowNumber
+from django.db.models.query import BaseIterable, ModelIterable, QuerySet
+from django.utils.functional import LazyObject, empty
 
 from .contenttypes import ct as ct_classes, get_content_type
 
 
+DEFAULT_PARALLEL_WORKERS = 4
+
+# the primary key fields the through model's foreign key can reliably be
+# converted to in SQL
+SQL_CONVERTIBLE_PKS = (IntegerField, CharField, TextField)
+
+def get_parallel_workers():
+    """
+    Returns the default maximum number of worker threads used to resolve
+    target objects, as set by the GM2M_PARALLEL_FETCH setting (0 or False
+    disables parallel resolution)
+    """
+    return int(getattr(settings, 'GM2M_PARALLEL_FETCH', 0) or 0)
+
+
+def get_target_db(model, using, hints):
+    """
+    Returns the database the instances of ``model`` should be read from,
+    when they are the targets of through rows retrieved from ``using`` with
+    the hints ``hints`` (which carry the source instance)
+    """
+    if hints:
+        return router.db_for_read(model, **hints)
+    return using
+
+
+def get_target_cache(through, model):
+    """
+    Returns the target cache of the GM2M field using the ``through`` model if
+    the instances of ``model`` should be cached, or None
+    """
+    field = getattr(through._meta, '_gm2m_field', None)
+    if field is None:
+        return None
+    return field.get_target_cache(model)
+
+
+def get_target_pk_field(model):
+    """
+    Returns the field holding the primary key values of ``model``, following
+    the one-to-one relations of multi-table inheritance
+    """
+    pk_field = model._meta.pk
+    while pk_field.is_relation:
+        pk_field = pk_field.target_field
+    return pk_field
+
+
+class ThroughUUID(Func):
+    """
+    Converts a through model's foreign key, holding the text representation
+    of UUIDs (with dashes), to the representation of UUIDField values in the
+    database
+    """
+
+    def __init__(self, expression):
+        super(ThroughUUID, self).__init__(expression,
+                                          output_field=UUIDField())
+
+    def as_sql(self, compiler, connection, **extra_context):
+        expression, = self.get_source_expressions()
+        if connection.features.has_native_uuid_field:
+            converted = Cast(expression, output_field=UUIDField())
+        else:
+            # the values are stored as 32 hexadecimal characters
+            converted = Replace(expression, Value('-'), Value(''))
+        return compiler.compile(converted)
+
+
+def match_through_fk(queryset, fk):
+    """
+    Filters a queryset of target objects, keeping the objects whose primary
+    key matches the ``fk`` expression referring to a through model's foreign
+    key
+    """
+    pk_field = get_target_pk_field(queryset.model)
+    if isinstance(pk_field, (CharField, TextField)):
+        return queryset.filter(pk=fk)
+    if isinstance(pk_field, IntegerField):
+        return queryset.filter(pk=Cast(fk, output_field=pk_field.clone()))
+    if isinstance(pk_field, UUIDField):
+        # the database representation of UUIDs is not always their text
+        # representation
+        return queryset.filter(pk=ThroughUUID(fk))
+    # the primary key is converted to a string, as it is in the through table
+    return queryset.annotate(
+        _gm2m_tgt_pk=Cast('pk', output_field=CharField())
+    ).filter(_gm2m_tgt_pk=fk)
+
+
+def fetch_targets(model, pks, using, cache=None):
+    """
+    Retrieves the instances of ``model`` whose primary keys are in ``pks``
+    in a single query, possibly using a target cache
+    """
+    if cache is None:
+        return model._default_manager.using(using).in_bulk(pks)
+
+    ct_id = get_content_type(model).pk
+    pk_field = model._meta.pk
+    pks = set(pk_field.to_python(pk) for pk in pks)
+
+    # the same primary key may refer to different objects in different
+    # databases
+    objects = dict((key[2], obj) for key, obj
+                   in cache.get_many((using, ct_id, pk) for pk in pks).items())
+
+    missing = pks.difference(objects)
+    if missing:
+        fetched = model._default_manager.using(using).in_bulk(missing)
+        entries = dict(((using, ct_id, pk), obj)
+                       for pk, obj in fetched.items())
+        # objects read in a transaction may be rolled back, they are only
+        # cached once it is committed (immediately in autocommit mode)
+        transaction.on_commit(lambda: cache.set_many(entries), using=using)
+        objects.update(fetched)
+
+    return objects
+
+
+def fetch_targets_in_thread(model, pks, using, cache=None):
+    """
+    Same as fetch_targets, but meant to be run in a worker thread, which has
+    its own database connection. This connection is closed once the targets
+    have been retrieved so that no connection outlives the thread pool
+    """
+    try:
+        return fetch_targets(model, pks, using, cache)
+    finally:
+        connections[using].close()
+
+
+class GM2MRef(namedtuple('GM2MRef', ('ct_id', 'pk'))):
+    """
+    A lightweight reference to a target object, made of its content type id
+    and its primary key
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_instance(cls, obj):
+        return cls(get_content_type(obj).pk, obj.pk)
+
+    @property
+    def model(self):
+        return ct_classes.ContentType.objects.get_for_id(self.ct_id) \
+                                             .model_class()
+
+
+def resolve_refs(refs, using=None, **hints):
+    """
+    Retrieves the objects the GM2MRef references in ``refs`` point to, with
+    one query per content type, and returns them in the same order
+    References to objects that do not exist anymore are skipped
+    If ``using`` is not provided, the database is given by the router
+    """
+    refs = list(refs)
+
+    pks = defaultdict(lambda: set())
+    for ref in refs:
+        pks[ref.ct_id].add(ref.pk)
+
+    objects = {}
+    for ct, ct_pks in pks.items():
+        model = ct_classes.ContentType.objects.get_for_id(ct).model_class()
+        db = using or router.db_for_read(model, **hints)
+        for pk, obj in fetch_targets(model, ct_pks, db).items():
+            objects[(ct, pk)] = obj
+
+    return [objects[ref] for ref in refs if ref in objects]
+
+
+class GM2MLazyTarget(LazyObject):
+    """
+    A proxy to a target object, that is only retrieved when the proxy is
+    accessed for the first time (along with the objects of all the other
+    proxies of the same content type). The GM2MRef reference of the target
+    object is available as ``gm2m_ref`` without retrieving it
+    """
+
+    def __init__(self, ref, loader):
+        self.__dict__['gm2m_ref'] = ref
+        self.__dict__['_loader'] = loader
+        super(GM2MLazyTarget, self).__init__()
+
+    def _setup(self):
+        self._loader.load(self.gm2m_ref.ct_id)
+        if self._wrapped is empty:
+            model = self.gm2m_ref.model
+            raise model.DoesNotExist(
+                '%s matching query does not exist (pk=%r).'
+                % (model._meta.object_name, self.gm2m_ref.pk)
+            )
+
+    def __repr__(self):
+        if self._wrapped is empty:
+            return '<%s: %r>' % (type(self).__name__, self.gm2m_ref)
+        return repr(self._wrapped)
+
+
+class GM2MLazyLoader(object):
+    """
+    Creates GM2MLazyTarget proxies and retrieves their objects in one query
+    per content type
+    """
+
+    def __init__(self, through, using, hints):
+        self.through = through
+        self.using = using
+        self.hints = hints
+        self.pending = defaultdict(lambda: defaultdict(lambda: []))
+
+    def add(self, ref):
+        proxy = GM2MLazyTarget(ref, self)
+        self.pending[ref.ct_id][ref.pk].append(proxy)
+        return proxy
+
+    def load(self, ct):
+        pending = self.pending.pop(ct, {})
+        if not pending:
+            return
+
+        model = ct_classes.ContentType.objects.get_for_id(ct).model_class()
+        db = get_target_db(model, self.using, self.hints)
+        objects = fetch_targets(model, pending.keys(), db,
+                                get_target_cache(self.through, model))
+
+        for pk, proxies in pending.items():
+            try:
+                obj = objects[pk]
+            except KeyError:
+                # the target object does not exist anymore
+                continue
+            for proxy in proxies:
+                proxy._wrapped = obj
+
+
 class GM2MTgtQuerySetIterable(ModelIterable):
 
     def __iter__(self):
@@ -30,18 +278,30 @@ class GM2MTgtQuerySetIterable(ModelIterable):
 
         extra_select = list(qs.query.extra_select)
 
-        for vl in qs.values_list(field_names['tgt_ct'],
-                                 field_names['tgt_fk'],
-                                 *extra_select):
+        if not rel_prefetching and not extra_select \
+        and self.can_fetch_targets():
+            # the target objects are retrieved in a single query
+            for obj in qs.targets():
+                yield obj
+            return
+
+        for vl in qs._target_rows(*extra_select):
             ct = vl[0]
             pk = fk_field.to_python(vl[1])
             ct_attrs[ct][pk].append(vl[2:])
             ordered_ct_attrs.append((ct, pk))
 
-        for ct, attrs in ct_attrs.items():
-            for pk, obj in ct_classes.ContentType.objects.get_for_id(ct).\
-                    model_class()._default_manager.in_bulk(attrs.keys()).\
-                    items():
+        plan = self.get_fetch_plan(ct_attrs.keys())
+
+        # when fetching in parallel, the content types are resolved in an
+        # arbitrary order, the objects need to be merged back in the through
+        # rows order
+        workers = self.get_workers(plan, len(ct_attrs))
+        merge = qs.ordered or workers > 1
+
+        for ct, bulk in self.fetch(ct_attrs, plan, workers):
+            attrs = ct_attrs[ct]
+            for pk, obj in bulk.items():
 
                 pk = fk_field.to_python(pk)
 
@@ -57,20 +317,133 @@ class GM2MTgtQuerySetIterable(ModelIterable):
                     # when prefetching related objects, one must yield one
                     # object per through model instance
                     for __ in attrs[pk]:
-                        if qs.ordered:
+                        if merge:
                             objects[(ct, pk)] = obj
                         else:
                             yield obj
                     continue
 
-                if qs.ordered:
+                if merge:
                     objects[(ct, pk)] = obj
                 else:
                     yield obj
 
-        if qs.ordered:
+        if merge:
             for ct, pk in ordered_ct_attrs:
-                yield objects[(ct, pk)]
+                try:
+                    yield objects[(ct, pk)]
+                except KeyError:
+                    # the target object does not exist anymore
+                    pass
+
+    def can_fetch_targets(self):
+        """
+        Returns True if the queryset is restricted to one target model and
+        the target objects can be retrieved in a single query, with their
+        order and the target cache irrelevant
+        """
+        qs = self.queryset
+        if qs._target_cts is None or len(qs._target_cts) != 1 \
+        or qs.ordered or not qs.query.can_filter() or qs._adjacency is not None:
+            return False
+
+        ct, = qs._target_cts
+        model = ct_classes.ContentType.objects.get_for_id(ct).model_class()
+        return get_target_cache(qs.model, model) is None \
+            and get_target_db(model, qs.db, qs._hints) == qs.db \
+            and isinstance(get_target_pk_field(model), SQL_CONVERTIBLE_PKS)
+
+    def get_fetch_plan(self, cts):
+        """
+        Returns a {database alias: [(content type id, model class), ...]}
+        dictionary, grouping the content types by the database the target
+        objects should be read from
+        """
+        qs = self.queryset
+
+        plan = defaultdict(lambda: [])
+        for ct in cts:
+            model = ct_classes.ContentType.objects.get_for_id(ct).model_class()
+            plan[get_target_db(model, qs.db, qs._hints)].append((ct, model))
+        return plan
+
+    def get_workers(self, plan, n_cts):
+        """
+        Returns the number of threads to use to resolve ``n_cts`` content
+        types (1 means the content types are resolved serially)
+        """
+        qs = self.queryset
+        workers = qs._parallel_workers
+        if workers is None:
+            workers = get_parallel_workers()
+
+        if workers < 2 or n_cts < 2:
+            return 1
+
+        if any(connections[db].in_atomic_block for db in plan):
+            # worker threads use their own connections and would not see the
+            # changes made in the current transaction
+            return 1
+
+        return min(workers, n_cts)
+
+    def fetch(self, ct_attrs, plan, workers=1):
+        """
+        Yields (content type id, {pk: object}) tuples, fetching the objects
+        with one query per content type on the database given by the fetch
+        plan, using a thread pool if workers > 1
+        """
+
+        through = self.queryset.model
+
+        if workers < 2:
+            for db, models in plan.items():
+                for ct, model in models:
+                    yield ct, fetch_targets(model, ct_attrs[ct].keys(), db,
+                                            get_target_cache(through, model))
+            return
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                (ct, executor.submit(fetch_targets_in_thread,
+                                     model, list(ct_attrs[ct].keys()), db,
+                                     get_target_cache(through, model)))
+                for db, models in plan.items()
+                for ct, model in models
+            ]
+            for ct, future in futures:
+                yield ct, future.result()
+
+
+class GM2MRefIterable(BaseIterable):
+    """
+    Yields a GM2MRef for each through row, without retrieving the target
+    objects
+    """
+
+    def __iter__(self):
+        qs = self.queryset
+
+        pk_fields = {}
+        for ct, pk in qs._target_rows():
+            try:
+                pk_field = pk_fields[ct]
+            except KeyError:
+                pk_field = pk_fields[ct] = ct_classes.ContentType.objects \
+                    .get_for_id(ct).model_class()._meta.pk
+            yield GM2MRef(ct, pk_field.to_python(pk))
+
+
+class GM2MLazyIterable(GM2MRefIterable):
+    """
+    Yields a GM2MLazyTarget proxy for each through row
+    """
+
+    def __iter__(self):
+        qs = self.queryset
+        loader = GM2MLazyLoader(qs.model, qs.db, qs._hints)
+        for ref in super(GM2MLazyIterable, self).__iter__():
+            yield loader.add(ref)
 
 
 class GM2MTgtQuerySet(QuerySet):
@@ -86,9 +459,27 @@ class GM2MTgtQuerySet(QuerySet):
         if self._iterable_class is ModelIterable:
             self._iterable_class = GM2MTgtQuerySetIterable
 
+        # None means that the GM2M_PARALLEL_FETCH setting is used
+        self._parallel_workers = None
+
+        # (cache, key) tuple set by the related manager if the source's
+        # adjacency list can be read from the adjacency cache. It is not
+        # copied to the clones, as they may filter out some through rows
+        self._adjacency = None
+
+        # the content type ids the queryset is restricted to by
+        # filter(Model=...), or None
+        self._target_cts = None
+
+    def _clone(self):
+        clone = super(GM2MTgtQuerySet, self)._clone()
+        clone._parallel_workers = self._parallel_workers
+        clone._target_cts = self._target_cts
+        return clone
+
     def filter(self, *args, **kwargs):
         model = kwargs.pop('Model', None)
-        models = kwargs.pop('Model__in', set())
+        models = set(kwargs.pop('Model__in', ()))
 
         if model:
             models.add(model)
@@ -102,4 +493,311 @@ class GM2MTgtQuerySet(QuerySet):
         if ctypes:
             kwargs[self.model._meta._field_names['tgt_ct'] + '__in'] = ctypes
 
-        return super(GM2MTgtQuerySet, self).filter(*args, **kwargs)
+        in_memory = ctypes and not args and len(kwargs) == 1 \
+            and self._result_cache is not None and self._prefetch_done
+
+        qs = super(GM2MTgtQuerySet, self).filter(*args, **kwargs)
+
+        if ctypes:
+            qs._target_cts = frozenset(ctypes) if self._target_cts is None \
+                             else self._target_cts.intersection(ctypes)
+
+        if in_memory:
+            # the objects have been prefetched, they are filtered in memory
+            # rather than retrieved again. The query is filtered all the same
+            # so that the queryset can be further refined
+            qs._result_cache = [obj for obj in self._result_cache
+                                if get_content_type(obj).pk in ctypes]
+            qs._prefetch_done = True
+
+        return qs
+
+    def targets(self, model=None):
+        """
+        Returns a queryset of the target objects of ``model``, which may be
+        omitted if the queryset is restricted to one model with
+        filter(Model=...). The objects are retrieved in a single query, and
+        the queryset can be filtered, ordered and sliced as any queryset of
+        the target model (the primary keys are retrieved beforehand if the
+        target model's primary key is not an integer or a string)
+        """
+        qs = self if model is None else self.filter(Model=model)
+
+        if qs._target_cts is None or len(qs._target_cts) > 1 \
+        or (model is None and not qs._target_cts):
+            # without the model argument, successive filters restricting the
+            # queryset to different models leave no model to return
+            raise ValueError('targets() requires a queryset restricted to a '
+                             'single target model, use filter(Model=...) '
+                             'or the model argument')
+
+        if not qs._target_cts:
+            # restricted to several models by successive filters
+            return model._default_manager.none()
+
+        ct, = qs._target_cts
+        model = ct_classes.ContentType.objects.get_for_id(ct).model_class()
+
+        fk = self.model._meta._field_names['tgt_fk']
+        pk_field = get_target_pk_field(model)
+        db = get_target_db(model, qs.db, qs._hints)
+
+        pks = qs.order_by().values_list(fk, flat=True)
+        if db != qs.db or not isinstance(pk_field, SQL_CONVERTIBLE_PKS):
+            # the primary keys have to be retrieved first if the through and
+            # target tables are not in the same database, or if the foreign
+            # key cannot reliably be converted in SQL (e.g. dates in sqlite)
+            pks = [pk_field.to_python(pk) for pk in pks]
+        elif isinstance(pk_field, IntegerField):
+            pks = qs.order_by().annotate(
+                _gm2m_tgt_pk=Cast(fk, output_field=pk_field.clone())
+            ).values_list('_gm2m_tgt_pk', flat=True)
+
+        return model._default_manager.using(db).filter(pk__in=pks)
+
+    def filter_targets(self, model, *args, **kwargs):
+        """
+        Only keeps the objects of ``model`` matching the given lookups, the
+        objects of the other models being left unaffected. The lookups are
+        evaluated in SQL, in an EXISTS subquery against the model's table
+        """
+        return self._filter_targets(model, args, kwargs, False)
+
+    def exclude_targets(self, model, *args, **kwargs):
+        """
+        Excludes the objects of ``model`` matching the given lookups, the
+        objects of the other models being left unaffected
+        """
+        return self._filter_targets(model, args, kwargs, True)
+
+    def _filter_targets(self, model, args, kwargs, negate):
+        if isinstance(model, str):
+            model = self.model._meta.apps.get_model(model)
+
+        field_names = self.model._meta._field_names
+        exists = Exists(match_through_fk(
+            model._default_manager.filter(*args, **kwargs),
+            OuterRef(field_names['tgt_fk'])
+        ))
+        if negate:
+            exists = ~exists
+
+        ct = get_content_type(model)
+        return self._filter_exists([
+            (~Q(**{field_names['tgt_ct']: ct}), None),
+            (Q(**{field_names['tgt_ct']: ct}), exists),
+        ])
+
+    def _filter_exists(self, conditions):
+        """
+        Keeps the through rows matching any of the (Q object, Exists
+        expression or None) conditions
+        """
+        if not conditions:
+            return self.none()
+
+        if django.VERSION >= (3, 0):
+            q = Q()
+            for cond, exists in conditions:
+                q |= cond if exists is None else cond & Q(exists)
+            return self.filter(q)
+
+        # Exists expressions cannot be used as filters before Django 3.0
+        annotations = {}
+        q = Q()
+        for cond, exists in conditions:
+            if exists is not None:
+                alias = '_gm2m_exists_%i' % (len(self.query.annotations)
+                                             + len(annotations))
+                annotations[alias] = exists
+                cond = cond & Q(**{alias: True})
+            q |= cond
+        return self.annotate(**annotations).filter(q)
+
+    def limit_per_model(self, n, *order_by):
+        """
+        Only keeps the ``n`` first objects of each model, in the order given
+        by ``order_by`` (through model fields, or target model fields prefixed
+        with 'target__', e.g. '-target__date'), defaulting to the through
+        model's primary key. The objects are ranked in SQL, with a ROW_NUMBER
+        window function partitioned by content type, which requires
+        Django 4.2 or later
+        """
+        if django.VERSION < (4, 2):
+            # window functions cannot be filtered on before Django 4.2, which
+            # would require retrieving the ranks of all the through rows
+            raise NotSupportedError('limit_per_model() requires Django 4.2 '
+                                    'or later')
+
+        ordering = []
+        annotations = {}
+        for i, name in enumerate(order_by or ('pk',)):
+            desc = name.startswith('-')
+            name = name.lstrip('-')
+            if name.startswith('target__'):
+                alias = '_gm2m_order_%i' % i
+                annotations[alias] = self._get_target_field(name[8:])
+                name = alias
+            ordering.append(F(name).desc() if desc else F(name).asc())
+        if 'pk' not in [name.lstrip('-') for name in order_by]:
+            # the ties, such as the objects of the models which do not have
+            # a target field, are ranked by primary key
+            ordering.append(F('pk').asc())
+
+        return self.annotate(**annotations).annotate(_gm2m_rank=Window(
+            expression=RowNumber(),
+            partition_by=[F(self.model._meta._field_names['tgt_ct'])],
+            order_by=ordering
+        )).filter(_gm2m_rank__lte=n)
+
+    def _get_target_field(self, name):
+        """
+        Returns an expression evaluating to the ``name`` field of the target
+        objects, for the models having such a field
+        """
+        field_names = self.model._meta._field_names
+
+        whens = []
+        output_field = None
+        for model in self._get_target_models():
+            try:
+                field = model._meta.get_field(name)
+            except FieldDoesNotExist:
+                continue
+            if output_field is None:
+                output_field = field.clone()
+            targets = match_through_fk(model._default_manager.all(),
+                                       OuterRef(field_names['tgt_fk']))
+            whens.append(When(
+                then=Subquery(targets.values(name)[:1]),
+                **{field_names['tgt_ct']: get_content_type(model)}
+            ))
+
+        if not whens:
+            raise FieldError('No target model has a field named %s' % name)
+        return Case(*whens, output_field=output_field)
+
+    def _get_target_models(self):
+        """
+        Returns the models the target objects may belong to
+        """
+        if self._target_cts is None:
+            return self.model._meta._gm2m_field \
+                       .get_related_models(include_auto=True)
+        return [ct_classes.ContentType.objects.get_for_id(ct).model_class()
+                for ct in self._target_cts]
+
+    def count_by_model(self, exclude_dangling=False):
+        """
+        Returns a {model: number of objects} dictionary, computed in a single
+        GROUP BY query, or from the prefetched objects. If exclude_dangling
+        is True, the through rows referring to objects that do not exist
+        anymore (which are never part of the prefetched objects) are not
+        counted
+        """
+        counts = defaultdict(int)
+
+        if self._result_cache is not None and self._prefetch_done:
+            for obj in self._result_cache:
+                counts[obj.__class__] += 1
+            return dict(counts)
+
+        qs = self
+        field_names = self.model._meta._field_names
+        if exclude_dangling:
+            qs = qs._filter_exists([
+                (Q(**{field_names['tgt_ct']: get_content_type(model)}),
+                 Exists(match_through_fk(model._default_manager.all(),
+                                         OuterRef(field_names['tgt_fk']))))
+                for model in qs._get_target_models()
+            ])
+
+        for ct, n in qs.order_by().values_list(field_names['tgt_ct']) \
+                       .annotate(_gm2m_count=Count('pk')):
+            model = ct_classes.ContentType.objects.get_for_id(ct) \
+                                                  .model_class()
+            if model is not None:
+                counts[model] += n
+        return dict(counts)
+
+    def by_model(self):
+        """
+        Returns a {model: [objects]} dictionary of the target objects, grouped
+        by model. No query is performed if the objects have been prefetched
+        """
+        objs = defaultdict(lambda: [])
+        for obj in self:
+            objs[obj.__class__].append(obj)
+        return dict(objs)
+
+    def count(self):
+        if self._result_cache is None and self._adjacency is not None:
+            return len(list(self._target_rows()))
+        return super(GM2MTgtQuerySet, self).count()
+
+    def _target_rows(self, *extra_select):
+        """
+        Returns the (content type id, primary key, *extra_select) tuples of
+        the through rows, reading them from the adjacency cache if possible
+        """
+        field_names = self.model._meta._field_names
+        rows = self.values_list(field_names['tgt_ct'],
+                                field_names['tgt_fk'],
+                                *extra_select)
+        if self._adjacency is None or extra_select:
+            return rows
+
+        cache, key = self._adjacency
+        try:
+            flat = cache.get_many((key,))[key]
+        except KeyError:
+            rows = list(rows)
+            # the adjacency list is stored as a flat (ct, pk, ct, pk ...)
+            # tuple rather than as a list of tuples. When read in a
+            # transaction, which may be rolled back, it is only cached once
+            # the transaction is committed
+            entries = {key: tuple(v for row in rows for v in row)}
+            transaction.on_commit(lambda: cache.set_many(entries),
+                                  using=self.db)
+            return rows
+        return zip(flat[::2], flat[1::2])
+
+    def _chain_adjacency(self):
+        # for the methods which do not alter the through rows
+        clone = self._chain()
+        clone._adjacency = self._adjacency
+        return clone
+
+    def parallel(self, max_workers=None):
+        """
+        Resolves the target objects of each content type concurrently, in a
+        pool of at most ``max_workers`` threads (defaults to the
+        GM2M_PARALLEL_FETCH setting, or to DEFAULT_PARALLEL_WORKERS if it is
+        not set). ``parallel(0)`` disables parallel resolution.
+        """
+        if max_workers is None:
+            max_workers = get_parallel_workers() or DEFAULT_PARALLEL_WORKERS
+        clone = self._chain_adjacency()
+        clone._parallel_workers = max_workers
+        return clone
+
+    def refs(self):
+        """
+        Returns a queryset yielding GM2MRef (content type id, primary key)
+        references instead of the target objects, so that the target objects
+        are not retrieved. The references can be resolved later on using
+        resolve_refs
+        """
+        clone = self._chain_adjacency()
+        clone._iterable_class = GM2MRefIterable
+        return clone
+
+    def lazy(self):
+        """
+        Returns a queryset yielding GM2MLazyTarget proxies, which only
+        retrieve the target objects of a given content type (in one query)
+        when one of them is accessed
+        """
+        clone = self._chain_adjacency()
+        clone._iterable_class = GM2MLazyIterable
+        return clone
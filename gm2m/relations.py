@@ -130,6 +130,9 @@ class GM2MRelation(ForeignObject):
                 # note that it is an homogeneous queryset (as Collector.collect
                 # which is called afterwards only works with homogeneous
                 # collections)
+                if self.field.adjacency_cache is not None:
+                    self.field.invalidate_adjacency(
+                        qs.values_list(field_names['src'], flat=True), using)
                 return qs
 
         # do not delete anything by default
@@ -409,6 +412,9 @@ class GM2MUnitRel(ForeignObjectRel):
         # path info retrieval functions on this
         fk_field = opts.get_field(opts._field_names['src'])
 
+        # as for ManyToManyField, the filtered relation only applies to the
+        # last join, its condition being added to this join's ON clause along
+        # with the content type restriction
         if reverse:
             pathinfos.extend(fk_field.get_reverse_path_info())
             # through > to part of the relation is generated manually
@@ -419,8 +425,8 @@ class GM2MUnitRel(ForeignObjectRel):
             # to > through part of the relation is generated manually
             opts = self.through._meta
             pathinfos.append(PathInfo(self.model._meta, opts, (opts.pk,),
-                                      self, False, False, filtered_relation))
-            pathinfos.extend(fk_field.get_path_info())
+                                      self, False, False, None))
+            pathinfos.extend(fk_field.get_path_info(filtered_relation))
         return pathinfos
 
     def get_path_info(self, filtered_relation=None):
@@ -786,6 +792,7 @@ class GM2MRel(ManyToManyRel):
                                 ('src', 'tgt', 'tgt_ct', 'tgt_fk')):
                     tf_dict[k] = f
                 rel.through._meta._field_names = tf_dict
+                rel.through._meta._gm2m_field = rel.field
                 return
 
             if rel.through_fields:
@@ -825,6 +832,7 @@ class GM2MRel(ManyToManyRel):
                 raise ValueError('Bad through model for GM2M relationship.')
 
             rel.through._meta._field_names = tf_dict
+            rel.through._meta._gm2m_field = rel.field
 
             # save the result in rel.through_fields so that it appears
             # in the deconstruction. Without that there would be no way for
@@ -0,0 +1,37 @@
+from django.db import models
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.contenttypes.fields import GenericForeignKey
+
+import gm2m
+from gm2m.cache import LocMemTargetCache
+
+from ..app.models import Project, Task
+
+
+class Links(models.Model):
+
+    class Meta:
+        app_label = 'adjacency'
+
+    related_objects = gm2m.GM2MField(Project, Task,
+                                     adjacency_cache=LocMemTargetCache())
+
+
+class ThroughLinks(models.Model):
+
+    class Meta:
+        app_label = 'adjacency'
+
+    related_objects = gm2m.GM2MField(Project, through='RelLinks',
+                                     adjacency_cache=LocMemTargetCache())
+
+
+class RelLinks(models.Model):
+
+    class Meta:
+        app_label = 'adjacency'
+
+    links = models.ForeignKey(ThroughLinks, on_delete=models.CASCADE)
+    target = GenericForeignKey(ct_field='target_ct', fk_field='target_fk')
+    target_ct = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    target_fk = models.CharField(max_length=255)
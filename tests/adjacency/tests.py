@@ -0,0 +1,174 @@
+from django.db import transaction
+
+import gm2m
+from gm2m.contenttypes import get_content_type
+
+from .. import base
+
+
+class AdjacencyCacheTests(base.TransactionTestCase):
+
+    def setUp(self):
+        self.cache = self.models.Links.related_objects.adjacency_cache
+        self.cache.clear()
+        self.cache.reset_stats()
+
+        self.project = self.models.Project.objects.create(name='project')
+        self.task = self.models.Task.objects.create(name='task')
+        self.links = self.models.Links.objects.create()
+        self.links.related_objects.add(self.project)
+
+    def test_cached_adjacency(self):
+        with self.assertNumQueries(2):
+            # through model + projects
+            self.assertListEqual(list(self.links.related_objects.all()),
+                                 [self.project])
+        with self.assertNumQueries(1):
+            # projects only
+            self.assertListEqual(list(self.links.related_objects.all()),
+                                 [self.project])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.links.related_objects.count(), 1)
+            self.assertEqual(len(list(self.links.related_objects.refs())), 1)
+        self.assertEqual(self.cache.misses, 1)
+        self.assertEqual(self.cache.hits, 3)
+
+    def test_filtered_queryset(self):
+        list(self.links.related_objects.all())
+        get_content_type(self.models.Task)
+        with self.assertNumQueries(1):
+            self.assertListEqual(list(self.links.related_objects
+                                          .filter(Model=self.models.Task)),
+                                 [])
+
+    def test_add(self):
+        list(self.links.related_objects.all())
+        self.links.related_objects.add(self.task)
+        self.assertSetEqual(set(self.links.related_objects.all()),
+                            {self.project, self.task})
+
+    def test_remove(self):
+        list(self.links.related_objects.all())
+        self.links.related_objects.remove(self.project)
+        self.assertListEqual(list(self.links.related_objects.all()), [])
+
+    def test_set(self):
+        list(self.links.related_objects.all())
+        self.links.related_objects.set([self.task])
+        self.assertListEqual(list(self.links.related_objects.all()),
+                             [self.task])
+        self.links.related_objects.set([self.project], clear=True)
+        self.assertListEqual(list(self.links.related_objects.all()),
+                             [self.project])
+        self.links.related_objects.set([self.task], server_side=True)
+        self.assertListEqual(list(self.links.related_objects.all()),
+                             [self.task])
+
+    def test_clear(self):
+        list(self.links.related_objects.all())
+        self.links.related_objects.clear()
+        self.assertListEqual(list(self.links.related_objects.all()), [])
+
+    def test_reverse_add_remove(self):
+        list(self.links.related_objects.all())
+        self.task.links_set.add(self.links)
+        self.assertSetEqual(set(self.links.related_objects.all()),
+                            {self.project, self.task})
+        self.task.links_set.remove(self.links)
+        self.assertListEqual(list(self.links.related_objects.all()),
+                             [self.project])
+
+    def test_reverse_set_clear(self):
+        links2 = self.models.Links.objects.create()
+        links2.related_objects.add(self.project)
+        list(self.links.related_objects.all())
+        list(links2.related_objects.all())
+
+        self.project.links_set.set([links2])
+        self.assertListEqual(list(self.links.related_objects.all()), [])
+        self.assertListEqual(list(links2.related_objects.all()),
+                             [self.project])
+
+        self.project.links_set.clear()
+        self.assertListEqual(list(links2.related_objects.all()), [])
+
+    def test_bulk(self):
+        links2 = self.models.Links.objects.create()
+        list(self.links.related_objects.all())
+        list(links2.related_objects.all())
+
+        self.models.Links.related_objects.bulk_add(
+            self.models.Links.objects.all(), self.task)
+        self.assertSetEqual(set(self.links.related_objects.all()),
+                            {self.project, self.task})
+        self.assertListEqual(list(links2.related_objects.all()), [self.task])
+
+        self.models.Links.related_objects.bulk_remove(
+            self.models.Links.objects.all(), self.task)
+        self.assertListEqual(list(self.links.related_objects.all()),
+                             [self.project])
+        self.assertListEqual(list(links2.related_objects.all()), [])
+
+        self.models.Links.related_objects.bulk_clear(
+            self.models.Links.objects.all())
+        self.assertListEqual(list(self.links.related_objects.all()), [])
+
+    def test_batch(self):
+        list(self.links.related_objects.all())
+        with gm2m.batch():
+            self.links.related_objects.add(self.task)
+            self.project.links_set.clear()
+        self.assertListEqual(list(self.links.related_objects.all()),
+                             [self.task])
+
+    def test_rollback(self):
+        list(self.links.related_objects.all())
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                self.links.related_objects.add(self.task)
+                self.assertEqual(len(list(self.links.related_objects.all())),
+                                 2)
+                raise ValueError
+
+        self.assertEqual(len(list(self.links.related_objects.refs())), 1)
+        self.assertListEqual(list(self.links.related_objects.all()),
+                             [self.project])
+
+    def test_cached_on_commit(self):
+        with transaction.atomic():
+            list(self.links.related_objects.all())
+            with self.assertNumQueries(2):
+                # through model + projects
+                list(self.links.related_objects.all())
+        with self.assertNumQueries(0):
+            self.assertEqual(self.links.related_objects.count(), 1)
+
+    def test_delete_target(self):
+        list(self.links.related_objects.all())
+        self.project.delete()
+        with self.assertNumQueries(1):
+            self.assertListEqual(list(self.links.related_objects.all()), [])
+
+    def test_delete_source(self):
+        list(self.links.related_objects.all())
+        key = self.models.Links._meta.get_field('related_objects') \
+                  .get_adjacency_key(self.links.pk)
+        self.links.delete()
+        self.assertDictEqual(self.cache.get_many((key,)), {})
+
+
+class ThroughAdjacencyCacheTests(base.TransactionTestCase):
+
+    def setUp(self):
+        self.project = self.models.Project.objects.create(name='project')
+        self.links = self.models.ThroughLinks.objects.create()
+        self.models.ThroughLinks.related_objects.adjacency_cache.clear()
+
+    def test_through_instances(self):
+        self.assertListEqual(list(self.links.related_objects.all()), [])
+        rel = self.models.RelLinks.objects.create(links=self.links,
+                                                  target=self.project)
+        self.assertListEqual(list(self.links.related_objects.all()),
+                             [self.project])
+        rel.delete()
+        self.assertListEqual(list(self.links.related_objects.all()), [])
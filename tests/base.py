@@ -200,6 +200,13 @@ class TestCase(_TestCase, test.TestCase):
             call_command('check')
 
 
+class TransactionTestCase(_TestCase, test.TransactionTestCase):
+    """
+    For tests that need the data to be committed (e.g. to be visible from
+    other threads)
+    """
+
+
 class MigrationsTestCase(_TestCase, test.TransactionTestCase):
     """
     Handles migration module deletion after they are generated
@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 
 import gm2m
@@ -11,6 +13,15 @@ class DailyTask(models.Model):
     time = models.TimeField(primary_key=True)
 
 
+class Event(models.Model):
+
+    class Meta:
+        app_label = 'exotic_pks_prefetching'
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4)
+    name = models.CharField(max_length=255)
+
+
 class Day(models.Model):
 
     class Meta:
@@ -4,6 +4,11 @@ types in the linked models
 """
 
 from datetime import date, time
+from unittest import skipIf
+
+import django
+
+from gm2m.expressions import GM2MContains, GM2MSourceExists
 
 from .. import base
 
@@ -12,6 +17,7 @@ class ExoticPKPrefetchTests(base.TestCase):
 
     def setUp(self):
         self.task = self.models.DailyTask.objects.create(time=time(12))
+        self.event = self.models.Event.objects.create(name='event')
         self.day = self.models.Day.objects.create(date=date.today())
 
         self.day.tasks.add(self.task)
@@ -26,3 +32,100 @@ class ExoticPKPrefetchTests(base.TestCase):
             self.models.DailyTask.objects.prefetch_related('days')[0],
             self.task
         )
+
+    def test_targets(self):
+        self.assertListEqual(
+            list(self.day.tasks.targets(self.models.DailyTask)), [self.task]
+        )
+
+    def test_filter_targets(self):
+        self.assertListEqual(
+            list(self.day.tasks.filter_targets(self.models.DailyTask,
+                                               time=time(12))),
+            [self.task]
+        )
+        self.assertListEqual(
+            list(self.day.tasks.exclude_targets(self.models.DailyTask,
+                                                time=time(12))),
+            []
+        )
+
+    def test_count_by_model_uuid(self):
+        self.day.tasks.add(self.event)
+        # a dangling through row
+        self.day.tasks.add(self.models.Event(name='deleted'))
+        self.assertDictEqual(
+            self.day.tasks.count_by_model(),
+            {self.models.DailyTask: 1, self.models.Event: 2}
+        )
+        self.assertDictEqual(
+            self.day.tasks.count_by_model(exclude_dangling=True),
+            {self.models.DailyTask: 1, self.models.Event: 1}
+        )
+
+    def test_contains(self):
+        self.day.tasks.add(self.event)
+        other_day = self.models.Day.objects.create(date=date(2000, 1, 1))
+        qs = self.models.Day.objects.order_by('date')
+        for targets, days in (
+            (self.models.Event.objects.all(), [self.day]),
+            (self.models.Event.objects.filter(name='other'), []),
+            (self.models.DailyTask.objects.all(), [self.day]),
+        ):
+            self.assertListEqual(
+                list(qs.filter(GM2MContains('tasks', targets))), days)
+        self.assertListEqual(
+            list(qs.exclude(GM2MContains('tasks',
+                                         self.models.Event.objects.all()))),
+            [other_day]
+        )
+
+    def test_source_exists(self):
+        self.day.tasks.add(self.event)
+        other = self.models.Event.objects.create(name='other')
+        self.models.Day.objects.create(date=date(2000, 1, 1)).tasks.add(other)
+        qs = self.models.Event.objects.all()
+        self.assertListEqual(
+            list(qs.filter(GM2MSourceExists('days', date=self.day.date))),
+            [self.event]
+        )
+        self.assertSetEqual(set(qs.filter(GM2MSourceExists('days'))),
+                            {self.event, other})
+        self.assertListEqual(
+            list(self.models.DailyTask.objects
+                     .filter(GM2MSourceExists('days', date=self.day.date))),
+            [self.task]
+        )
+
+    @skipIf(django.VERSION < (4, 2), 'window filtering requires Django 4.2')
+    def test_limit_per_model_uuid(self):
+        events = [self.models.Event.objects.create(name=name)
+                  for name in ('b', 'c', 'a')]
+        for event in events:
+            self.day.tasks.add(event)
+        self.assertSetEqual(
+            set(self.day.tasks.limit_per_model(2, 'target__name')),
+            {self.task, events[2], events[0]}
+        )
+        self.assertSetEqual(
+            set(self.day.tasks.limit_per_model(1, '-target__name')),
+            {self.task, events[1]}
+        )
+
+    def test_filter_targets_uuid(self):
+        self.day.tasks.add(self.event)
+        self.assertListEqual(
+            list(self.day.tasks.filter_targets(self.models.Event,
+                                               name='event')),
+            [self.task, self.event]
+        )
+        self.assertListEqual(
+            list(self.day.tasks.exclude_targets(self.models.Event,
+                                                name='event')),
+            [self.task]
+        )
+        self.assertListEqual(
+            list(self.day.tasks.filter_targets(self.models.Event,
+                                               name='other')),
+            [self.task]
+        )
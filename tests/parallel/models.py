@@ -0,0 +1,13 @@
+from django.db import models
+
+import gm2m
+
+from ..app.models import Project, Task
+
+
+class Links(models.Model):
+
+    class Meta:
+        app_label = 'parallel'
+
+    related_objects = gm2m.GM2MField(Project, Task)
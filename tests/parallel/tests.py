@@ -0,0 +1,88 @@
+import threading
+
+from django.db import connections, transaction
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+
+from gm2m.query import fetch_targets_in_thread
+
+from .. import base
+from ..mock import mock
+
+
+class ParallelFetchTests(base.TransactionTestCase):
+
+    def setUp(self):
+        self.links = self.models.Links.objects.create()
+        self.items = []
+        for i in range(3):
+            self.items.append(self.models.Project.objects.create())
+            self.items.append(self.models.Task.objects.create())
+        for item in self.items:
+            # one by one, so that the through rows are in the same order
+            self.links.related_objects.add(item)
+
+    def test_through_rows_order(self):
+        self.assertListEqual(
+            list(self.links.related_objects.parallel(2).order_by('-id')),
+            list(reversed(self.items))
+        )
+
+    def test_same_result_as_serial(self):
+        self.assertListEqual(
+            list(self.links.related_objects.parallel(2).order_by('id')),
+            list(self.links.related_objects.order_by('id'))
+        )
+
+    def test_setting(self):
+        with override_settings(GM2M_PARALLEL_FETCH=2):
+            with mock.patch('gm2m.query.fetch_targets_in_thread',
+                            wraps=fetch_targets_in_thread) as fetch:
+                self.assertSetEqual(set(self.links.related_objects.all()),
+                                    set(self.items))
+                self.assertEqual(fetch.call_count, 2)
+
+    def test_disabled(self):
+        with override_settings(GM2M_PARALLEL_FETCH=2):
+            with mock.patch('gm2m.query.fetch_targets_in_thread') as fetch:
+                self.assertSetEqual(
+                    set(self.links.related_objects.parallel(0)),
+                    set(self.items)
+                )
+                self.assertEqual(fetch.call_count, 0)
+
+    def test_serial_in_transaction(self):
+        # worker threads would not see the uncommitted changes
+        with transaction.atomic():
+            task = self.models.Task.objects.create()
+            self.links.related_objects.add(task)
+            with mock.patch('gm2m.query.fetch_targets_in_thread') as fetch:
+                self.assertIn(task, self.links.related_objects.parallel(2))
+                self.assertEqual(fetch.call_count, 0)
+
+    def test_connections_cleanup(self):
+        main_thread = threading.current_thread()
+        opened = []
+
+        def on_connection_created(sender, connection, **kwargs):
+            if threading.current_thread() is not main_thread:
+                opened.append(connection)
+
+        wrapper_cls = connections['default'].__class__
+        close = wrapper_cls.close
+        closed = []
+
+        def spy_close(wrapper):
+            closed.append(wrapper)
+            return close(wrapper)
+
+        connection_created.connect(on_connection_created)
+        try:
+            with mock.patch.object(wrapper_cls, 'close', spy_close):
+                list(self.links.related_objects.parallel(2))
+        finally:
+            connection_created.disconnect(on_connection_created)
+
+        self.assertTrue(opened)
+        for connection in opened:
+            self.assertIn(connection, closed)
@@ -5,7 +5,11 @@ DATABASES = {
     'default': {
         'NAME': 'gm2m',
         'ENGINE': 'django.db.backends.sqlite3',
-    }
+    },
+    'other': {
+        'NAME': 'gm2m_other',
+        'ENGINE': 'django.db.backends.sqlite3',
+    },
 }
 
 INSTALLED_APPS = (
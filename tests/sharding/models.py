@@ -0,0 +1,21 @@
+from django.db import models
+
+import gm2m
+
+from ..app.models import Project, Task
+
+
+class Links(models.Model):
+
+    class Meta:
+        app_label = 'sharding'
+
+    related_objects = gm2m.GM2MField(Project, Task)
+
+
+class CachedLinks(models.Model):
+
+    class Meta:
+        app_label = 'sharding'
+
+    related_objects = gm2m.GM2MField(Project, cache_targets=(Project,))
@@ -0,0 +1,66 @@
+"""
+The Links instances and their through rows are spread across two databases,
+with the default routing (i.e. each instance is read from and written to the
+database it has been retrieved from). The primary keys are unique across the
+databases
+"""
+
+from django.core.management import call_command
+from django.db.models import prefetch_related_objects
+
+from .. import base
+
+
+class ShardedPrefetchTests(base.TestCase):
+
+    databases = {'default', 'other'}
+
+    @classmethod
+    def setUpClass(cls):
+        super(ShardedPrefetchTests, cls).setUpClass()
+        call_command('migrate', run_syncdb=True, database='other',
+                     verbosity=0, interactive=False)
+
+    def setUp(self):
+        self.targets = {}
+        for pk, db in enumerate(('default', 'other'), 1):
+            links = self.models.Links.objects.using(db).create(pk=pk)
+            targets = [
+                self.models.Project.objects.using(db).create(pk=pk, name=db),
+                self.models.Task.objects.using(db).create(pk=pk, name=db),
+            ]
+            links.related_objects.add(*targets)
+            self.targets[db] = set((t.__class__, t.name) for t in targets)
+
+    def get_links(self):
+        return list(self.models.Links.objects.using('default')) \
+            + list(self.models.Links.objects.using('other'))
+
+    def test_prefetch_forward(self):
+        links = self.get_links()
+
+        with self.assertNumQueries(3, using='default'), \
+             self.assertNumQueries(3, using='other'):
+            # on each database, 1 query for the through model instances, 1
+            # for the projects and 1 for the tasks
+            prefetch_related_objects(links, 'related_objects')
+
+        for l in links:
+            self.assertSetEqual(
+                set((t.__class__, t.name)
+                    for t in l.related_objects.all()),
+                self.targets[l._state.db]
+            )
+
+    def test_prefetch_reverse(self):
+        projects = list(self.models.Project.objects.using('default')) \
+            + list(self.models.Project.objects.using('other'))
+
+        with self.assertNumQueries(1, using='default'), \
+             self.assertNumQueries(1, using='other'):
+            prefetch_related_objects(projects, 'links_set')
+
+        for p in projects:
+            links = list(p.links_set.all())
+            self.assertEqual(len(links), 1)
+            self.assertEqual(links[0]._state.db, p._state.db)
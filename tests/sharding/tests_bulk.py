@@ -0,0 +1,71 @@
+"""
+The bulk operations write the through rows to the databases of the source
+objects
+"""
+
+from django.core.management import call_command
+
+from .. import base
+
+
+class ShardedBulkTests(base.TestCase):
+
+    databases = {'default', 'other'}
+
+    @classmethod
+    def setUpClass(cls):
+        super(ShardedBulkTests, cls).setUpClass()
+        call_command('migrate', run_syncdb=True, database='other',
+                     verbosity=0, interactive=False)
+
+    def setUp(self):
+        self.links = {}
+        self.projects = {}
+        for pk, db in enumerate(('default', 'other'), 1):
+            self.links[db] = self.models.Links.objects.using(db).create(pk=pk)
+            self.projects[db] = self.models.Project.objects.using(db) \
+                                    .create(pk=pk, name=db)
+
+    def get_names(self, db):
+        return [p.name for p in self.links[db].related_objects.all()]
+
+    def count_rows(self, db):
+        through = self.models.Links._meta.get_field(
+            'related_objects').remote_field.through
+        return through._default_manager.using(db).count()
+
+    def test_bulk_set(self):
+        self.assertTupleEqual(
+            self.models.Links.related_objects.bulk_set({
+                self.links['default']: [self.projects['default']],
+                self.links['other']: [self.projects['other']],
+            }),
+            (2, 0)
+        )
+        self.assertListEqual(self.get_names('default'), ['default'])
+        self.assertListEqual(self.get_names('other'), ['other'])
+        self.assertEqual(self.count_rows('default'), 1)
+        self.assertEqual(self.count_rows('other'), 1)
+
+        self.assertTupleEqual(
+            self.models.Links.related_objects.bulk_set({
+                self.links['other']: [],
+            }),
+            (0, 1)
+        )
+        self.assertListEqual(self.get_names('default'), ['default'])
+        self.assertListEqual(self.get_names('other'), [])
+
+    def test_bulk_add_clear(self):
+        sources = self.models.Links.objects.using('other')
+        self.assertEqual(
+            self.models.Links.related_objects.bulk_add(
+                sources, self.projects['other']),
+            1
+        )
+        self.assertListEqual(self.get_names('other'), ['other'])
+        self.assertEqual(self.count_rows('default'), 0)
+
+        self.assertEqual(
+            self.models.Links.related_objects.bulk_clear(sources), 1)
+        self.assertEqual(self.count_rows('other'), 0)
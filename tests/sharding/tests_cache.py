@@ -0,0 +1,72 @@
+"""
+The same primary keys are used in both databases, for objects holding
+different data
+"""
+
+from django.core.management import call_command
+from django.test import override_settings
+
+from .. import base
+
+
+class ReplicaRouter(object):
+    """
+    Reads the projects from the other database, as from a replica
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.model_name == 'project':
+            return 'other'
+        return None
+
+
+class ShardedTargetCacheTests(base.TestCase):
+
+    databases = {'default', 'other'}
+
+    @classmethod
+    def setUpClass(cls):
+        super(ShardedTargetCacheTests, cls).setUpClass()
+        call_command('migrate', run_syncdb=True, database='other',
+                     verbosity=0, interactive=False)
+
+    def setUp(self):
+        self.models.CachedLinks.related_objects.target_cache.clear()
+        self.links = {}
+        for pk, db in enumerate(('default', 'other'), 1):
+            # the project has the same primary key in both databases
+            project = self.models.Project.objects.using(db) \
+                          .create(pk=1, name=db)
+            links = self.models.CachedLinks.objects.using(db).create(pk=pk)
+            links.related_objects.add(project)
+            self.links[db] = links
+
+    def get_names(self, db):
+        # the objects are cached when the reads are committed, the
+        # transactions of the tests are not
+        with self.captureOnCommitCallbacks(using='default', execute=True), \
+             self.captureOnCommitCallbacks(using='other', execute=True):
+            return [p.name for p in self.links[db].related_objects.all()]
+
+    def test_cache_per_database(self):
+        for __ in range(2):
+            self.assertListEqual(self.get_names('default'), ['default'])
+            self.assertListEqual(self.get_names('other'), ['other'])
+
+    def test_invalidate_per_database(self):
+        self.get_names('default')
+        self.get_names('other')
+        project = self.models.Project.objects.using('other').get(pk=1)
+        project.name = 'renamed'
+        project.save()
+        self.assertListEqual(self.get_names('default'), ['default'])
+        self.assertListEqual(self.get_names('other'), ['renamed'])
+
+    def test_invalidate_routed(self):
+        with override_settings(DATABASE_ROUTERS=[ReplicaRouter()]):
+            self.assertListEqual(self.get_names('default'), ['other'])
+            # the change is replicated, then signaled on the primary
+            self.models.Project.objects.using('other').filter(pk=1) \
+                .update(name='replicated')
+            self.models.Project.objects.using('default').get(pk=1).save()
+            self.assertListEqual(self.get_names('default'), ['replicated'])
@@ -0,0 +1,92 @@
+"""
+The router sends the reads to another database than the one the instances
+have been retrieved from
+"""
+
+from django.core.management import call_command
+from django.db.models import prefetch_related_objects
+from django.test.utils import override_settings
+
+from .. import base
+
+
+class TargetsRouter(object):
+    """
+    Reads the projects from the other database
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.model_name == 'project':
+            return 'other'
+        return None
+
+
+class LinksRouter(object):
+    """
+    Reads the relations of the links with an even primary key from the other
+    database
+    """
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None \
+           and instance._meta.model_name == 'links' \
+           and instance.pk % 2 == 0:
+            return 'other'
+        return None
+
+
+class RoutingTests(base.TestCase):
+
+    databases = {'default', 'other'}
+
+    @classmethod
+    def setUpClass(cls):
+        super(RoutingTests, cls).setUpClass()
+        call_command('migrate', run_syncdb=True, database='other',
+                     verbosity=0, interactive=False)
+
+    def setUp(self):
+        for db in ('default', 'other'):
+            # the projects have the same primary keys in both databases
+            self.models.Project.objects.using(db).create(pk=1, name=db)
+            self.models.Task.objects.using(db).create(pk=1, name=db)
+
+    def get_names(self, links):
+        return sorted((t.__class__.__name__, t.name)
+                      for t in links.related_objects.all())
+
+    def test_targets_other_db(self):
+        links = self.models.Links.objects.create(pk=1)
+        links.related_objects.add(self.models.Project.objects.get(pk=1),
+                                  self.models.Task.objects.get(pk=1))
+
+        with override_settings(DATABASE_ROUTERS=[TargetsRouter()]):
+            with self.assertNumQueries(2, using='default'), \
+                 self.assertNumQueries(1, using='other'):
+                # the through rows and the tasks are read from the default
+                # database, the projects from the other one
+                self.assertListEqual(self.get_names(links),
+                                     [('Project', 'other'),
+                                      ('Task', 'default')])
+
+    def test_prefetch_grouped_by_db(self):
+        for pk, db in ((1, 'default'), (2, 'other')):
+            links = self.models.Links.objects.using(db).create(pk=pk)
+            links.related_objects.add(
+                self.models.Project.objects.using(db).get(pk=1))
+        # the links are all retrieved from the default database
+        self.models.Links.objects.create(pk=2)
+        links = list(self.models.Links.objects.order_by('pk'))
+
+        with override_settings(DATABASE_ROUTERS=[LinksRouter()]):
+            with self.assertNumQueries(2, using='default'), \
+                 self.assertNumQueries(2, using='other'):
+                # on each database, 1 query for the through model instances
+                # and 1 for the projects
+                prefetch_related_objects(links, 'related_objects')
+
+        self.assertListEqual(self.get_names(links[0]),
+                             [('Project', 'default')])
+        self.assertListEqual(self.get_names(links[1]),
+                             [('Project', 'other')])
@@ -1,3 +1,12 @@
+import copy
+import pickle
+from unittest import skipIf
+
+import django
+from django.db.models import Count, FilteredRelation, Q
+
+from gm2m.contenttypes import get_content_type
+
 from .. import base
 
 
@@ -50,6 +59,40 @@ class RelatedTests(base.TestCase):
             [self.models.Project, self.models.Task]
         )
 
+    def test_cached_managers(self):
+        self.assertIs(self.links.related_objects, self.links.related_objects)
+        self.assertIs(self.project.links_set, self.project.links_set)
+
+    def test_cached_manager_pk_change(self):
+        links = self.models.Links()
+        manager = links.related_objects
+        links.save()
+        self.assertIsNot(links.related_objects, manager)
+        links.related_objects.add(self.project)
+        self.assertListEqual(list(links.related_objects.all()),
+                             [self.project])
+
+    def test_cached_managers_copy(self):
+        manager = self.links.related_objects
+        for links in (copy.copy(self.links),
+                      pickle.loads(pickle.dumps(self.links))):
+            self.assertIsNot(links.related_objects, manager)
+            self.assertIs(links.related_objects.instance, links)
+        self.assertIs(self.links.related_objects, manager)
+
+    def test_count_references(self):
+        links2 = self.models.Links.objects.create()
+        project2 = self.models.Project.objects.create()
+        task = self.models.Task.objects.create()
+        self.links.related_objects.add(self.project, task)
+        links2.related_objects.add(self.project)
+
+        with self.assertNumQueries(2):
+            # 1 per content type
+            counts = self.models.Links.related_objects.count_references(
+                [self.project, project2, task])
+        self.assertDictEqual(counts, {self.project: 2, project2: 0, task: 1})
+
 
 class ReverseOperationsTest(base.TestCase):
 
@@ -106,11 +149,161 @@ class FilterTests(base.TestCase):
             {self.project, task},
         )
 
+    def test_single_model_query(self):
+        self.links.related_objects.add(self.models.Task.objects.create())
+        with self.assertNumQueries(1):
+            self.assertListEqual(
+                list(self.links.related_objects
+                         .filter(Model=self.models.Project)),
+                [self.project],
+            )
+
+    def test_targets(self):
+        projects = [self.models.Project.objects.create(name=str(i))
+                    for i in range(3)]
+        self.links.related_objects.add(*projects)
+        self.links.related_objects.add(self.models.Task.objects.create())
+
+        targets = self.links.related_objects.targets(self.models.Project)
+        with self.assertNumQueries(1):
+            self.assertListEqual(
+                list(targets.exclude(name='').order_by('-name')[:2]),
+                [projects[2], projects[1]]
+            )
+
+        self.assertEqual(self.links.related_objects
+                             .filter(Model='app.Task').targets().count(), 1)
+        self.assertEqual(self.links.related_objects
+                             .filter(Model='app.Task')
+                             .targets(self.models.Project).count(), 0)
+
+        with self.assertRaises(ValueError):
+            self.links.related_objects.targets()
+        with self.assertRaises(ValueError):
+            self.links.related_objects.filter(Model='app.Task') \
+                                      .filter(Model=self.models.Project) \
+                                      .targets()
+
+    def test_filter_targets(self):
+        self.project.name = 'open'
+        self.project.save()
+        closed = self.models.Project.objects.create(name='closed')
+        task = self.models.Task.objects.create(name='task')
+        self.links.related_objects.add(closed, task)
+
+        with self.assertNumQueries(3):
+            # through model + projects + tasks
+            self.assertSetEqual(
+                set(self.links.related_objects
+                        .filter_targets(self.models.Project, name='open')),
+                {self.project, task}
+            )
+        self.assertSetEqual(
+            set(self.links.related_objects
+                    .filter_targets(self.models.Project, name='open')
+                    .filter_targets('app.Task', name='other')),
+            {self.project}
+        )
+        self.assertSetEqual(
+            set(self.links.related_objects
+                    .exclude_targets(self.models.Project, name='open')),
+            {closed, task}
+        )
+        self.assertListEqual(
+            list(self.links.related_objects
+                     .filter_targets(self.models.Project, name='open')
+                     .targets(self.models.Project)),
+            [self.project]
+        )
+
+    @skipIf(django.VERSION < (4, 2), 'window filtering requires Django 4.2')
+    def test_limit_per_model(self):
+        projects = [self.project] + [
+            self.models.Project.objects.create(name='p%i' % i)
+            for i in range(3)
+        ]
+        tasks = [self.models.Task.objects.create(name='t%i' % i)
+                 for i in range(3)]
+        for obj in projects[1:] + tasks:
+            self.links.related_objects.add(obj)
+
+        with self.assertNumQueries(3):
+            # through model + projects + tasks
+            self.assertSetEqual(
+                set(self.links.related_objects.limit_per_model(2)),
+                set(projects[:2] + tasks[:2])
+            )
+        self.assertSetEqual(
+            set(self.links.related_objects.limit_per_model(1, '-pk')),
+            {projects[3], tasks[2]}
+        )
+        self.assertSetEqual(
+            set(self.links.related_objects
+                    .limit_per_model(2, '-target__name')),
+            {projects[3], projects[2], tasks[2], tasks[1]}
+        )
+        self.assertListEqual(
+            list(self.links.related_objects.filter(Model=self.models.Task)
+                     .limit_per_model(1, 'target__name')),
+            [tasks[0]]
+        )
+
+    def test_count_by_model(self):
+        tasks = [self.models.Task.objects.create() for __ in range(2)]
+        self.links.related_objects.add(*tasks)
+        # a dangling through row
+        through = self.models.Links.related_objects.through
+        field_names = through._meta._field_names
+        through.objects.create(**{
+            field_names['src']: self.links,
+            field_names['tgt_ct']: get_content_type(self.models.Task),
+            field_names['tgt_fk']: '999'
+        })
+
+        with self.assertNumQueries(1):
+            self.assertDictEqual(
+                self.links.related_objects.count_by_model(),
+                {self.models.Project: 1, self.models.Task: 3}
+            )
+        with self.assertNumQueries(1):
+            self.assertDictEqual(
+                self.links.related_objects
+                    .count_by_model(exclude_dangling=True),
+                {self.models.Project: 1, self.models.Task: 2}
+            )
+
+        links = self.models.Links.objects \
+                    .prefetch_related('related_objects').get()
+        with self.assertNumQueries(0):
+            self.assertDictEqual(
+                links.related_objects.count_by_model(),
+                {self.models.Project: 1, self.models.Task: 2}
+            )
+
     def test_reverse_chain_filter(self):
         self.assertEqual(
             self.models.Project.objects.filter(links__name='Links')[0],
             self.project)
 
+    def test_filtered_relation(self):
+        project2 = self.models.Project.objects.create()
+        links2 = self.models.Links.objects.create(name='Links2')
+        links2.related_objects.add(self.project, project2)
+
+        qs = self.models.Project.objects.annotate(
+            named_links=FilteredRelation('links',
+                                         condition=Q(links__name='Links'))
+        )
+        self.assertListEqual(
+            list(qs.annotate(n=Count('named_links'))
+                   .order_by('pk').values_list('pk', 'n')),
+            [(self.project.pk, 1), (project2.pk, 0)]
+        )
+        self.assertListEqual(
+            list(qs.filter(named_links__isnull=False)),
+            [self.project]
+        )
+
 
 class DeletionTests(base.TestCase):
 
@@ -186,3 +379,85 @@ class PrefetchTests(base.TestCase):
                       for t in self.models.Task.objects.all()]
 
         self.assertEqual(prefetched, normal)
+
+    def test_prefetched_add_remove(self):
+        links = self.models.Links.objects \
+                    .prefetch_related('related_objects')[0]
+        project = self.models.Project.objects.create()
+        before = list(links.related_objects.all())
+
+        links.related_objects.add(project)
+        with self.assertNumQueries(0):
+            self.assertListEqual(list(links.related_objects.all()),
+                                 before + [project])
+
+        links.related_objects.remove(before[0], project)
+        with self.assertNumQueries(0):
+            self.assertListEqual(list(links.related_objects.all()),
+                                 before[1:])
+
+        self.assertSetEqual(set(self.models.Links.objects.get(pk=links.pk)
+                                    .related_objects.all()),
+                            set(before[1:]))
+
+    def test_prefetched_set_clear(self):
+        links = self.models.Links.objects \
+                    .prefetch_related('related_objects')[0]
+        project = self.models.Project.objects.create()
+        before = list(links.related_objects.all())
+
+        links.related_objects.set([before[1], project])
+        with self.assertNumQueries(0):
+            self.assertListEqual(list(links.related_objects.all()),
+                                 [before[1], project])
+
+        links.related_objects.clear()
+        with self.assertNumQueries(0):
+            self.assertListEqual(list(links.related_objects.all()), [])
+
+    def test_prefetched_reverse_add_remove(self):
+        task = self.models.Task.objects.prefetch_related('links_set')[0]
+        links = self.models.Links.objects.create()
+
+        task.links_set.add(links)
+        with self.assertNumQueries(0):
+            self.assertEqual(len(task.links_set.all()), 2)
+
+        task.links_set.remove(links)
+        with self.assertNumQueries(0):
+            self.assertEqual(len(task.links_set.all()), 1)
+
+    def test_prefetched_filter(self):
+        links = self.models.Links.objects \
+                    .prefetch_related('related_objects')[0]
+        objs = list(links.related_objects.all())
+
+        with self.assertNumQueries(0):
+            projects = list(links.related_objects
+                                 .filter(Model=self.models.Project))
+            both = list(links.related_objects.filter(
+                Model__in={self.models.Project, 'app.Task'}))
+        self.assertListEqual(projects, [o for o in objs
+                                        if isinstance(o, self.models.Project)])
+        self.assertListEqual(both, objs)
+
+        # the query is filtered all the same
+        with self.assertNumQueries(1):
+            pks = list(links.related_objects
+                            .filter(Model=self.models.Project)
+                            .values_list('gm2m_pk', flat=True))
+        self.assertListEqual(pks, [str(projects[0].pk)])
+
+    def test_by_model(self):
+        links = self.models.Links.objects \
+                    .prefetch_related('related_objects')[0]
+        with self.assertNumQueries(0):
+            by_model = links.related_objects.by_model()
+        self.assertSetEqual(set(by_model.keys()),
+                            {self.models.Project, self.models.Task})
+        self.assertEqual(len(by_model[self.models.Project]), 1)
+        self.assertEqual(len(by_model[self.models.Task]), 5)
+
+        links = self.models.Links.objects.get(pk=links.pk)
+        self.assertEqual(len(links.related_objects.by_model()
+                                  [self.models.Task]), 5)
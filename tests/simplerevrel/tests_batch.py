@@ -0,0 +1,175 @@
+import gm2m
+
+from .. import base
+
+
+class BatchTests(base.TestCase):
+
+    def setUp(self):
+        self.project1 = self.models.Project.objects.create()
+        self.project2 = self.models.Project.objects.create()
+        self.task = self.models.Task.objects.create()
+        self.links1 = self.models.Links.objects.create(name='1')
+        self.links2 = self.models.Links.objects.create(name='2')
+        self.links1.related_objects.add(self.project1)
+
+    def assertRelated(self, links, objs):
+        self.assertSetEqual(set(links.related_objects.all()), set(objs))
+
+    def test_batch(self):
+        through = self.models.Links.related_objects.through
+        with gm2m.batch():
+            self.links1.related_objects.add(self.project2, self.task)
+            self.links2.related_objects.add(self.project1)
+            self.links1.related_objects.remove(self.project1)
+            self.project2.links_set.add(self.links2)
+            # the changes are not applied yet
+            self.assertEqual(through.objects.count(), 1)
+
+        self.assertRelated(self.links1, [self.project2, self.task])
+        self.assertRelated(self.links2, [self.project1, self.project2])
+
+    def test_queries(self):
+        with self.assertNumQueries(2):
+            # a grouped delete and a bulk insert
+            with gm2m.batch():
+                for i in range(3):
+                    self.links1.related_objects.add(self.project2)
+                    self.links2.related_objects.add(self.task)
+                    self.links1.related_objects.remove(self.project1)
+        self.assertRelated(self.links1, [self.project2])
+        self.assertRelated(self.links2, [self.task])
+
+    def test_existing(self):
+        with gm2m.batch():
+            self.links1.related_objects.add(self.project1, self.project2)
+        self.assertRelated(self.links1, [self.project1, self.project2])
+
+    def test_set_clear(self):
+        self.links2.related_objects.add(self.task)
+        with gm2m.batch():
+            self.links1.related_objects.add(self.task)
+            self.links1.related_objects.set([self.project2])
+            self.links1.related_objects.add(self.project1)
+            self.links2.related_objects.add(self.project1)
+            self.links2.related_objects.clear()
+            self.project1.links_set.clear()
+            self.project1.links_set.add(self.links2)
+        self.assertRelated(self.links1, [self.project2])
+        self.assertRelated(self.links2, [self.project1])
+
+    def test_set_diff(self):
+        through = self.models.Links.related_objects.through
+        row = through.objects.get()
+        with self.assertNumQueries(2):
+            # the existing relations are read, and the missing one added
+            with gm2m.batch():
+                self.links1.related_objects.set([self.project1, self.task])
+        self.assertRelated(self.links1, [self.project1, self.task])
+        # the relation to project1 has been kept
+        self.assertTrue(through.objects.filter(pk=row.pk).exists())
+
+        with self.assertNumQueries(1):
+            with gm2m.batch():
+                self.links1.related_objects.set([self.task, self.project1])
+
+    def test_set_target(self):
+        self.links2.related_objects.add(self.task)
+        with gm2m.batch():
+            self.links1.related_objects.set([self.task])
+            self.task.links_set.set([self.links2])
+            self.links2.related_objects.set([self.project2, self.task])
+            self.project2.links_set.remove(self.links2)
+        self.assertRelated(self.links1, [])
+        self.assertRelated(self.links2, [self.task])
+
+    def test_reads_flush(self):
+        with gm2m.batch():
+            self.links1.related_objects.add(self.task)
+            self.assertRelated(self.links1, [self.project1, self.task])
+            self.links1.related_objects.remove(self.project1)
+            self.assertListEqual(list(self.project1.links_set.all()), [])
+
+    def test_prefetched(self):
+        links = self.models.Links.objects.prefetch_related('related_objects') \
+                    .get(pk=self.links1.pk)
+        with gm2m.batch():
+            links.related_objects.add(self.task)
+            with self.assertNumQueries(0):
+                self.assertSetEqual(set(links.related_objects.all()),
+                                    {self.project1, self.task})
+        self.assertRelated(self.links1, [self.project1, self.task])
+
+    def test_exception(self):
+        with self.assertRaises(ValueError):
+            with gm2m.batch():
+                self.links1.related_objects.add(self.task)
+                raise ValueError
+        self.assertRelated(self.links1, [self.project1])
+
+    def test_exception_prefetched(self):
+        links = self.models.Links.objects.prefetch_related('related_objects') \
+                    .get(pk=self.links1.pk)
+        with self.assertRaises(ValueError):
+            with gm2m.batch():
+                links.related_objects.add(self.task)
+                raise ValueError
+        # the prefetched objects are retrieved again
+        with self.assertNumQueries(2):
+            self.assertListEqual(list(links.related_objects.all()),
+                                 [self.project1])
+
+    def test_discard(self):
+        links = self.models.Links.objects.prefetch_related('related_objects') \
+                    .get(pk=self.links1.pk)
+        with gm2m.batch() as batch:
+            links.related_objects.remove(self.project1)
+            batch.discard()
+        self.assertListEqual(list(links.related_objects.all()),
+                             [self.project1])
+
+    def test_discard_once(self):
+        links = self.models.Links.objects.prefetch_related('related_objects') \
+                    .get(pk=self.links1.pk)
+        with gm2m.batch() as batch:
+            for __ in range(3):
+                links.related_objects.add(self.task)
+            self.assertEqual(len(batch.managers), 1)
+            batch.discard()
+
+    def test_server_side_set(self):
+        with self.assertRaises(ValueError):
+            with gm2m.batch():
+                self.links1.related_objects.set([self.task], server_side=True)
+                raise ValueError
+        self.assertRelated(self.links1, [self.project1])
+
+        with gm2m.batch():
+            self.links1.related_objects.set([self.task], server_side=True)
+        self.assertRelated(self.links1, [self.task])
+
+    def test_nested(self):
+        with gm2m.batch():
+            with gm2m.batch():
+                self.links2.related_objects.add(self.task)
+            self.assertEqual(
+                self.models.Links.related_objects.through.objects.count(), 1)
+            self.assertEqual(self.task.links_set.count(), 1)
+        self.assertRelated(self.links2, [self.task])
+
+    def test_nested_exception(self):
+        links = self.models.Links.objects.prefetch_related('related_objects') \
+                    .get(pk=self.links2.pk)
+        with gm2m.batch():
+            self.links1.related_objects.add(self.task)
+            try:
+                with gm2m.batch():
+                    links.related_objects.add(self.project2)
+                    self.links1.related_objects.remove(self.project1)
+                    raise ValueError
+            except ValueError:
+                pass
+            # the prefetched objects are retrieved again
+            self.assertListEqual(list(links.related_objects.all()), [])
+        self.assertRelated(self.links1, [self.project1, self.task])
+        self.assertRelated(self.links2, [])
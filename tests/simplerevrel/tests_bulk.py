@@ -0,0 +1,205 @@
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from .. import base
+
+
+class BulkTests(base.TestCase):
+
+    def setUp(self):
+        self.project1 = self.models.Project.objects.create()
+        self.project2 = self.models.Project.objects.create()
+        self.task = self.models.Task.objects.create()
+        self.links = [self.models.Links.objects.create(name=str(i))
+                      for i in range(4)]
+        self.links[0].related_objects.add(self.project1)
+        self.links[3].related_objects.add(self.project1, self.task)
+
+    def assertRelated(self, links, objs):
+        self.assertSetEqual(set(links.related_objects.all()), set(objs))
+
+    def test_bulk_add(self):
+        sources = self.models.Links.objects.filter(name__in=['0', '1', '2'])
+        with self.assertNumQueries(1):
+            added = self.models.Links.related_objects.bulk_add(
+                sources, self.project1, self.project2)
+        # links 0 was already related to project1
+        self.assertEqual(added, 5)
+
+        for links in self.links[:3]:
+            self.assertRelated(links, [self.project1, self.project2])
+        self.assertRelated(self.links[3], [self.project1, self.task])
+
+        # adding again does not create any relation
+        self.assertEqual(
+            self.models.Links.related_objects.bulk_add(sources,
+                                                       self.project2), 0)
+        self.assertEqual(self.project2.links_set.count(), 3)
+
+    def test_bulk_add_many_targets(self):
+        tasks = [self.models.Task.objects.create() for __ in range(10)]
+        with self.assertNumQueries(1):
+            # a single statement whatever the number of target objects
+            added = self.models.Links.related_objects.bulk_add(
+                self.models.Links.objects.all(), self.task, *tasks)
+        # links 3 was already related to task
+        self.assertEqual(added, 43)
+        self.assertRelated(self.links[0], [self.project1, self.task] + tasks)
+
+    def test_bulk_add_sliced(self):
+        sources = self.models.Links.objects.order_by('name')[1:3]
+        self.assertEqual(
+            self.models.Links.related_objects.bulk_add(sources, self.task), 2)
+        self.assertSetEqual(set(self.task.links_set.all()),
+                            set(self.links[1:]))
+
+    def test_bulk_remove(self):
+        self.links[0].related_objects.add(self.task)
+        with self.assertNumQueries(1):
+            removed = self.models.Links.related_objects.bulk_remove(
+                self.models.Links.objects.exclude(name='0'),
+                self.project1, self.task)
+        self.assertEqual(removed, 2)
+        self.assertRelated(self.links[0], [self.project1, self.task])
+        self.assertRelated(self.links[3], [])
+        self.assertEqual(
+            self.models.Links.related_objects.bulk_remove(
+                self.models.Links.objects.all()), 0)
+
+    def test_bulk_clear(self):
+        self.links[1].related_objects.add(self.project2)
+        with self.assertNumQueries(1):
+            removed = self.models.Links.related_objects.bulk_clear(
+                self.models.Links.objects.filter(name__in=['1', '3']))
+        self.assertEqual(removed, 3)
+        self.assertRelated(self.links[0], [self.project1])
+        self.assertRelated(self.links[1], [])
+        self.assertRelated(self.links[3], [])
+
+    def test_bulk_set(self):
+        with self.assertNumQueries(3):
+            # read + delete + insert
+            added, removed = self.models.Links.related_objects.bulk_set({
+                self.links[0]: [self.project1, self.project2],
+                self.links[1]: [self.task],
+                self.links[3]: [],
+            })
+        self.assertEqual((added, removed), (2, 2))
+        self.assertRelated(self.links[0], [self.project1, self.project2])
+        self.assertRelated(self.links[1], [self.task])
+        self.assertRelated(self.links[2], [])
+        self.assertRelated(self.links[3], [])
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.models.Links.related_objects.bulk_set({
+                self.links[0]: [self.project2, self.project1],
+                self.links[1]: [self.task, self.task],
+            }), (0, 0))
+
+    def test_bulk_set_batches(self):
+        relations = dict((links, [self.project2]) for links in self.links)
+        with self.assertNumQueries(2 + 2 + 2):
+            # 2 reads, 2 deletes, 2 inserts
+            self.assertEqual(self.models.Links.related_objects.bulk_set(
+                relations, batch_size=2), (4, 3))
+        for links in self.links:
+            self.assertRelated(links, [self.project2])
+
+    def test_bulk_set_prefetched(self):
+        links = self.models.Links.objects.prefetch_related('related_objects') \
+                    .get(pk=self.links[3].pk)
+        self.models.Links.related_objects.bulk_set({links: [self.project2]})
+        with self.assertNumQueries(0):
+            self.assertListEqual(list(links.related_objects.all()),
+                                 [self.project2])
+
+    def test_server_side_set(self):
+        links = self.links[3]
+        links.related_objects.set(
+            (obj for obj in [self.project2, self.task, self.task]),
+            server_side=True)
+        self.assertRelated(links, [self.project2, self.task])
+        self.assertRelated(self.links[0], [self.project1])
+
+        links.related_objects.set([self.project1], server_side=True,
+                                  clear=True)
+        self.assertRelated(links, [self.project1])
+
+        links.related_objects.set([], server_side=True)
+        self.assertRelated(links, [])
+
+    def test_server_side_set_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.links[3].related_objects.set([self.project2],
+                                              server_side=True)
+        # the existing relations are not retrieved
+        self.assertListEqual(
+            [q['sql'] for q in queries.captured_queries
+             if q['sql'].startswith('SELECT')],
+            []
+        )
+        self.assertRelated(self.links[3], [self.project2])
+
+    def test_server_side_set_error(self):
+        def objs():
+            yield self.project2
+            raise RuntimeError
+
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.links[3].related_objects.set(objs(), server_side=True)
+        self.assertRelated(self.links[3], [self.project1, self.task])
+
+        # the staging table has been dropped
+        self.links[3].related_objects.set([self.project2], server_side=True)
+        self.assertRelated(self.links[3], [self.project2])
+
+    def test_server_side_set_reverse(self):
+        self.project1.links_set.set([self.links[1], self.links[3]],
+                                    server_side=True)
+        self.assertSetEqual(set(self.project1.links_set.all()),
+                            {self.links[1], self.links[3]})
+        self.assertRelated(self.links[0], [])
+        self.assertRelated(self.links[3], [self.project1, self.task])
+
+    def test_server_side_set_prefetched(self):
+        links = self.models.Links.objects.prefetch_related('related_objects') \
+                    .get(pk=self.links[3].pk)
+        links.related_objects.set([self.project2], server_side=True)
+        self.assertListEqual(list(links.related_objects.all()),
+                             [self.project2])
+
+    def test_copy_from(self):
+        self.links[1].related_objects.add(self.project2)
+        with self.assertNumQueries(1):
+            added = self.links[1].related_objects.copy_from(self.links[0],
+                                                            self.links[3])
+        self.assertEqual(added, 2)
+        self.assertRelated(self.links[1],
+                           [self.project1, self.project2, self.task])
+        self.assertRelated(self.links[0], [self.project1])
+        self.assertRelated(self.links[3], [self.project1, self.task])
+
+        self.assertEqual(
+            self.links[1].related_objects.copy_from(self.links[3]), 0)
+        self.assertEqual(
+            self.links[1].related_objects.copy_from(self.links[1]), 0)
+
+    def test_move_from(self):
+        self.links[0].related_objects.add(self.project2)
+        with self.assertNumQueries(2):
+            added = self.links[3].related_objects.move_from(self.links[0])
+        self.assertEqual(added, 1)
+        self.assertRelated(self.links[3],
+                           [self.project1, self.project2, self.task])
+        self.assertRelated(self.links[0], [])
+
+    def test_move_from_prefetched(self):
+        links0, links3 = self.models.Links.objects.order_by('name') \
+                             .filter(name__in=['0', '3']) \
+                             .prefetch_related('related_objects')
+        links0.related_objects.add(self.project2)
+        links3.related_objects.move_from(links0)
+        with self.assertNumQueries(0):
+            self.assertListEqual(list(links0.related_objects.all()), [])
+        self.assertSetEqual(set(links3.related_objects.all()),
+                            {self.project1, self.project2, self.task})
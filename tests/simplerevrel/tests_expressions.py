@@ -0,0 +1,166 @@
+from django.core.exceptions import FieldError
+from django.db.models import Exists, F, OuterRef, Q
+from django.db.models.functions import Upper
+
+from gm2m.expressions import GM2MCount, GM2MExists, GM2MContains, \
+    GM2MSourceExists
+
+from .. import base
+
+
+class ExpressionsTests(base.TestCase):
+
+    def setUp(self):
+        self.links1 = self.models.Links.objects.create(name='1')
+        self.links2 = self.models.Links.objects.create(name='2')
+        self.links3 = self.models.Links.objects.create(name='3')
+        self.links1.related_objects.add(self.models.Project.objects.create(),
+                                        self.models.Project.objects.create(),
+                                        self.models.Task.objects.create())
+        self.links2.related_objects.add(self.models.Task.objects.create())
+
+    def test_count(self):
+        with self.assertNumQueries(1):
+            counts = list(self.models.Links.objects.order_by('name').annotate(
+                n=GM2MCount('related_objects'),
+                n_projects=GM2MCount('related_objects', self.models.Project),
+            ).values_list('n', 'n_projects'))
+        self.assertListEqual(counts, [(3, 2), (1, 0), (0, 0)])
+
+        self.assertListEqual(
+            list(self.models.Links.objects
+                     .annotate(n=GM2MCount('related_objects', 'app.Task'))
+                     .filter(n__gte=1).order_by('name')),
+            [self.links1, self.links2]
+        )
+
+    def test_exists(self):
+        with self.assertNumQueries(1):
+            exists = list(self.models.Links.objects.order_by('name').annotate(
+                has_any=GM2MExists('related_objects'),
+                has_project=GM2MExists('related_objects',
+                                       self.models.Project),
+            ).values_list('has_any', 'has_project'))
+        self.assertListEqual(exists,
+                             [(True, True), (True, False), (False, False)])
+
+        self.assertListEqual(
+            list(self.models.Links.objects
+                     .filter(GM2MExists('related_objects', 'app.Task'))
+                     .order_by('name')),
+            [self.links1, self.links2]
+        )
+
+    def test_contains(self):
+        project1, project2 = self.links1.related_objects \
+                                 .filter(Model=self.models.Project)
+        task2 = self.links2.related_objects.get()
+
+        self.assertListEqual(
+            list(self.models.Links.objects
+                     .filter(GM2MContains('related_objects', project1))),
+            [self.links1]
+        )
+        self.assertListEqual(
+            list(self.models.Links.objects
+                     .filter(GM2MContains('related_objects', project2, task2))
+                     .order_by('name')),
+            [self.links1, self.links2]
+        )
+        self.assertListEqual(
+            list(self.models.Links.objects.exclude(
+                GM2MContains('related_objects', project2, task2)
+            )),
+            [self.links3]
+        )
+
+    def test_contains_queryset(self):
+        task1 = self.links1.related_objects.filter(Model=self.models.Task) \
+                                           .get()
+        self.models.Task.objects.filter(pk=task1.pk).update(name='task1')
+
+        with self.assertNumQueries(1):
+            self.assertListEqual(
+                list(self.models.Links.objects.filter(GM2MContains(
+                    'related_objects',
+                    self.models.Task.objects.filter(name='task1')
+                ))),
+                [self.links1]
+            )
+        self.assertListEqual(
+            list(self.models.Links.objects.filter(GM2MContains(
+                'related_objects',
+                self.models.Task.objects.all(),
+                self.models.Project.objects.none()
+            )).order_by('name')),
+            [self.links1, self.links2]
+        )
+
+
+class SourceExistsTests(base.TestCase):
+
+    def setUp(self):
+        self.project1 = self.models.Project.objects.create()
+        self.project2 = self.models.Project.objects.create()
+        self.project3 = self.models.Project.objects.create()
+        self.links1 = self.models.Links.objects.create(name='a')
+        self.links2 = self.models.Links.objects.create(name='a')
+        self.links3 = self.models.Links.objects.create(name='b')
+        self.links1.related_objects.add(self.project1, self.project2)
+        self.links2.related_objects.add(self.project1)
+        self.links3.related_objects.add(self.project3,
+                                        self.models.Task.objects.create())
+
+    def test_source_exists(self):
+        qs = self.models.Project.objects.order_by('pk')
+        # the join duplicates project1
+        self.assertListEqual(list(qs.filter(links__name='a')),
+                             [self.project1, self.project1, self.project2])
+        self.assertListEqual(
+            list(qs.filter(GM2MSourceExists('links', name='a'))),
+            [self.project1, self.project2]
+        )
+        self.assertListEqual(
+            list(qs.filter(GM2MSourceExists('links', Q(name='b') |
+                                                     Q(pk=self.links2.pk)))),
+            [self.project1, self.project3]
+        )
+        self.assertListEqual(
+            list(qs.exclude(GM2MSourceExists('links'))),
+            []
+        )
+        self.assertListEqual(
+            list(qs.annotate(has_b=GM2MSourceExists('links', name='b'))
+                   .values_list('has_b', flat=True)),
+            [False, False, True]
+        )
+
+    def test_source_exists_expressions(self):
+        qs = self.models.Project.objects.order_by('pk')
+        # the F() references are relative to the source model
+        self.assertListEqual(
+            list(qs.filter(GM2MSourceExists('links', name=F('name'),
+                                            pk__gte=F('pk')))),
+            [self.project1, self.project2, self.project3]
+        )
+        self.assertListEqual(
+            list(qs.filter(GM2MSourceExists('links',
+                                            name__iexact=Upper('name')))),
+            [self.project1, self.project2, self.project3]
+        )
+        # the outer references to the target model
+        self.project2.name = 'a'
+        self.project2.save()
+        self.assertListEqual(
+            list(qs.filter(GM2MSourceExists('links', name=OuterRef('name')))),
+            [self.project2]
+        )
+
+    def test_source_exists_invalid(self):
+        with self.assertRaises(FieldError):
+            list(self.models.Project.objects
+                     .filter(GM2MSourceExists('related_objects')))
+        with self.assertRaises(ValueError):
+            list(self.models.Project.objects.filter(GM2MSourceExists(
+                'links', Exists(self.models.Links.objects.all())
+            )))
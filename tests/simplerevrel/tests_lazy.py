@@ -0,0 +1,40 @@
+from gm2m.query import GM2MRef
+
+from .. import base
+
+
+class LazyTests(base.TestCase):
+
+    def setUp(self):
+        self.projects = [self.models.Project.objects.create(name='p%i' % i)
+                         for i in range(2)]
+        self.tasks = [self.models.Task.objects.create(name='t%i' % i)
+                      for i in range(2)]
+        self.links = self.models.Links.objects.create()
+        self.links.related_objects.add(*(self.projects + self.tasks))
+
+    def test_lazy_loading(self):
+        with self.assertNumQueries(1):
+            proxies = list(self.links.related_objects.order_by('id').lazy())
+
+        projects = [p for p in proxies
+                    if p.gm2m_ref.model is self.models.Project]
+        self.assertEqual(len(projects), 2)
+
+        with self.assertNumQueries(1):
+            # only the projects are retrieved, the tasks are never loaded
+            self.assertSetEqual(set(p.name for p in projects), {'p0', 'p1'})
+
+    def test_proxy(self):
+        proxy = list(self.links.related_objects
+                         .filter(Model=self.models.Task).lazy())[0]
+        self.assertIsInstance(proxy.gm2m_ref, GM2MRef)
+        self.assertIn(proxy, self.tasks)
+        self.assertIsInstance(proxy, self.models.Task)
+
+    def test_deleted_target(self):
+        proxies = list(self.links.related_objects
+                           .filter(Model=self.models.Task).lazy())
+        self.models.Task.objects.all().delete()
+        with self.assertRaises(self.models.Task.DoesNotExist):
+            proxies[0].name
@@ -0,0 +1,151 @@
+import base64
+import json
+
+from django.core.paginator import EmptyPage
+from django.http import Http404
+from django.test import RequestFactory
+from django.views.generic import ListView
+
+from gm2m.pagination import GM2MCursorPaginator, GM2MCursorPaginationMixin, \
+    InvalidCursor
+
+from .. import base
+
+
+class CursorPaginationTests(base.TestCase):
+
+    def setUp(self):
+        self.links = self.models.Links.objects.create()
+        self.objs = []
+        for i in range(4):
+            self.objs.append(self.models.Project.objects.create())
+            self.objs.append(self.models.Task.objects.create())
+        for obj in self.objs:
+            # one by one, to keep the through rows in order
+            self.links.related_objects.add(obj)
+
+    def test_forward(self):
+        paginator = GM2MCursorPaginator(self.links.related_objects.all(), 3)
+        self.assertEqual(paginator.count, 8)
+        self.assertEqual(paginator.num_pages, 3)
+
+        with self.assertNumQueries(3):
+            # through model + projects + tasks
+            page = paginator.page()
+        self.assertListEqual(list(page), self.objs[:3])
+        self.assertFalse(page.has_previous())
+
+        page = paginator.page(page.next_page_number())
+        self.assertListEqual(list(page), self.objs[3:6])
+
+        page = paginator.page(page.next_page_number())
+        self.assertListEqual(list(page), self.objs[6:])
+        self.assertFalse(page.has_next())
+
+    def test_backward(self):
+        paginator = GM2MCursorPaginator(self.links.related_objects.all(), 3)
+        page = paginator.page(paginator.page(1).next_page_number())
+        page = paginator.page(page.next_page_number())
+
+        page = paginator.page(page.previous_page_number())
+        self.assertListEqual(list(page), self.objs[3:6])
+        self.assertTrue(page.has_next())
+
+        page = paginator.page(page.previous_page_number())
+        self.assertListEqual(list(page), self.objs[:3])
+        self.assertFalse(page.has_previous())
+
+    def test_ordering(self):
+        paginator = GM2MCursorPaginator(self.links.related_objects.all(), 5,
+                                        ordering='-pk')
+        page = paginator.page()
+        self.assertListEqual(list(page), self.objs[:2:-1])
+        self.assertListEqual(list(paginator.page(page.next_cursor)),
+                             self.objs[2::-1])
+
+    def test_filtered_queryset(self):
+        paginator = GM2MCursorPaginator(
+            self.links.related_objects.filter(Model=self.models.Task), 3)
+        page = paginator.page()
+        self.assertListEqual(list(page), self.objs[1:6:2])
+        self.assertListEqual(list(paginator.page(page.next_cursor)),
+                             [self.objs[7]])
+
+    def test_page_indexes(self):
+        paginator = GM2MCursorPaginator(self.links.related_objects.all(), 3,
+                                        orphans=1)
+        page = paginator.page(1)
+        self.assertEqual(page.number, 1)
+        self.assertEqual((page.start_index(), page.end_index()), (1, 3))
+
+        cursor = page.next_page_number()
+        page = paginator.page(cursor)
+        self.assertEqual(page.number, cursor)
+        with self.assertNumQueries(1):
+            self.assertEqual((page.start_index(), page.end_index()), (4, 6))
+
+        page = paginator.page(paginator.page(page.next_page_number())
+                              .previous_page_number())
+        self.assertEqual((page.start_index(), page.end_index()), (4, 6))
+
+        paginator = GM2MCursorPaginator(self.links.related_objects.all(), 5,
+                                        ordering='-pk')
+        page = paginator.page(paginator.page().next_page_number())
+        self.assertEqual((page.start_index(), page.end_index()), (6, 8))
+
+    def test_get_page(self):
+        paginator = GM2MCursorPaginator(self.links.related_objects.all(), 3)
+        self.assertListEqual(list(paginator.get_page('invalid')),
+                             self.objs[:3])
+
+    def test_empty_first_page(self):
+        self.links.related_objects.clear()
+        paginator = GM2MCursorPaginator(self.links.related_objects.all(), 3)
+        page = paginator.page()
+        self.assertListEqual(list(page), [])
+        self.assertEqual((page.start_index(), page.end_index()), (0, 0))
+
+        paginator = GM2MCursorPaginator(self.links.related_objects.all(), 3,
+                                        allow_empty_first_page=False)
+        with self.assertRaises(EmptyPage):
+            paginator.page()
+
+    def test_list_view(self):
+        links = self.links
+
+        class View(GM2MCursorPaginationMixin, ListView):
+            paginate_by = 3
+            pagination_ordering = '-pk'
+
+            def get_queryset(self):
+                return links.related_objects.all()
+
+        def get_context(**params):
+            view = View()
+            view.setup(RequestFactory().get('/', params))
+            view.object_list = view.get_queryset()
+            return view.get_context_data()
+
+        context = get_context()
+        self.assertTrue(context['is_paginated'])
+        self.assertListEqual(list(context['object_list']),
+                             self.objs[:-4:-1])
+
+        context = get_context(page=context['page_obj'].next_page_number())
+        self.assertListEqual(list(context['object_list']),
+                             self.objs[-4:-7:-1])
+
+        with self.assertRaises(Http404):
+            get_context(page='invalid')
+
+    def test_invalid_cursor(self):
+        paginator = GM2MCursorPaginator(self.links.related_objects.all(), 3)
+        with self.assertRaises(InvalidCursor):
+            paginator.page('invalid')
+
+        for data in ([False, 'abc', 1, '1'], [False, [1], 1, '1'],
+                     [False, 1, None, '1'], ['yes', 1, 1, '1'],
+                     [False, 1, 1], {'0': False}, 1):
+            cursor = base64.urlsafe_b64encode(json.dumps(data).encode('utf-8'))
+            with self.assertRaises(InvalidCursor):
+                paginator.page(cursor.decode('ascii'))
@@ -0,0 +1,48 @@
+from gm2m.query import GM2MRef, resolve_refs
+
+from .. import base
+
+
+class RefsTests(base.TestCase):
+
+    def setUp(self):
+        self.project = self.models.Project.objects.create()
+        self.task = self.models.Task.objects.create()
+        self.links = self.models.Links.objects.create()
+        self.links.related_objects.add(self.project, self.task)
+
+    def test_refs(self):
+        with self.assertNumQueries(1):
+            refs = set(self.links.related_objects.refs())
+
+        self.assertSetEqual(refs, {GM2MRef.from_instance(self.project),
+                                   GM2MRef.from_instance(self.task)})
+
+    def test_membership(self):
+        refs = set(self.links.related_objects.refs())
+        self.assertIn(GM2MRef.from_instance(self.project), refs)
+        self.assertNotIn(
+            GM2MRef.from_instance(self.models.Project.objects.create()),
+            refs
+        )
+
+    def test_filter(self):
+        refs = list(self.links.related_objects
+                        .filter(Model=self.models.Task).refs())
+        self.assertListEqual(refs, [GM2MRef.from_instance(self.task)])
+        self.assertIs(refs[0].model, self.models.Task)
+
+    def test_resolve(self):
+        refs = list(self.links.related_objects.order_by('id').refs())
+
+        with self.assertNumQueries(2):
+            # 1 query per content type
+            objs = resolve_refs(refs)
+
+        self.assertListEqual(objs, list(self.links.related_objects
+                                            .order_by('id')))
+
+    def test_resolve_deleted(self):
+        refs = list(self.links.related_objects.refs())
+        self.models.Task.objects.all().delete()
+        self.assertListEqual(resolve_refs(refs), [self.project])
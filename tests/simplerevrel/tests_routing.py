@@ -0,0 +1,46 @@
+from django.db import DEFAULT_DB_ALIAS
+from django.test.utils import override_settings
+
+from .. import base
+
+
+class RecordingRouter(object):
+    """
+    Records the read queries routing requests and sends them to the default
+    database
+    """
+
+    def __init__(self):
+        self.reads = []
+
+    def db_for_read(self, model, **hints):
+        self.reads.append((model, hints.get('instance')))
+        return DEFAULT_DB_ALIAS
+
+
+class RoutingTests(base.TestCase):
+
+    def setUp(self):
+        self.router = RecordingRouter()
+        self.project = self.models.Project.objects.create()
+        self.task = self.models.Task.objects.create()
+        self.links = self.models.Links.objects.create()
+        self.links.related_objects.add(self.project, self.task)
+
+    def test_targets_routing(self):
+        with override_settings(DATABASE_ROUTERS=[self.router]):
+            self.assertSetEqual(set(self.links.related_objects.all()),
+                                {self.project, self.task})
+
+        self.assertIn((self.models.Project, self.links), self.router.reads)
+        self.assertIn((self.models.Task, self.links), self.router.reads)
+
+    def test_prefetch_routing(self):
+        with override_settings(DATABASE_ROUTERS=[self.router]):
+            links = self.models.Links.objects \
+                                     .prefetch_related('related_objects')[0]
+            self.assertSetEqual(set(links.related_objects.all()),
+                                {self.project, self.task})
+
+        self.assertIn((self.models.Project, links), self.router.reads)
+        self.assertIn((self.models.Task, links), self.router.reads)
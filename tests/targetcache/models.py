@@ -0,0 +1,30 @@
+from django.db import models
+
+import gm2m
+from gm2m.cache import LocMemTargetCache, DjangoTargetCache
+
+from ..app.models import Project, Task
+
+
+class Links(models.Model):
+
+    class Meta:
+        app_label = 'targetcache'
+
+    related_objects = gm2m.GM2MField(
+        Project, Task,
+        cache_targets=('app.Project',),
+        target_cache=LocMemTargetCache(max_size=3)
+    )
+
+
+class DjangoCacheLinks(models.Model):
+
+    class Meta:
+        app_label = 'targetcache'
+
+    related_objects = gm2m.GM2MField(
+        Project,
+        cache_targets=(Project,),
+        target_cache=DjangoTargetCache()
+    )
@@ -0,0 +1,141 @@
+from django.db import transaction
+
+from gm2m.query import resolve_refs
+
+from .. import base
+from ..mock import mock
+
+
+class TargetCacheTests(base.TransactionTestCase):
+
+    def setUp(self):
+        self.cache = self.models.Links.related_objects.target_cache
+        self.cache.clear()
+        self.cache.reset_stats()
+
+        self.project = self.models.Project.objects.create(name='project')
+        self.task = self.models.Task.objects.create(name='task')
+        self.links = self.models.Links.objects.create()
+        self.links.related_objects.add(self.project, self.task)
+
+    def test_cached_model(self):
+        with self.assertNumQueries(3):
+            # through model + projects + tasks
+            self.assertSetEqual(set(self.links.related_objects.all()),
+                                {self.project, self.task})
+        self.assertEqual(self.cache.misses, 1)
+
+        with self.assertNumQueries(2):
+            # the project is retrieved from the cache
+            self.assertSetEqual(set(self.links.related_objects.all()),
+                                {self.project, self.task})
+        self.assertEqual(self.cache.hits, 1)
+        self.assertEqual(self.cache.misses, 1)
+
+    def test_lazy(self):
+        list(self.links.related_objects.all())
+        proxy = list(self.links.related_objects
+                         .filter(Model=self.models.Project).lazy())[0]
+        with self.assertNumQueries(0):
+            self.assertEqual(proxy.name, 'project')
+
+    def test_invalidate_on_save(self):
+        list(self.links.related_objects.all())
+        self.project.name = 'renamed'
+        self.project.save()
+
+        self.assertIn('renamed', [o.name for o
+                                  in self.links.related_objects.all()])
+        self.assertEqual(self.cache.misses, 2)
+
+    def test_invalidate_on_delete(self):
+        list(self.links.related_objects.all())
+        refs = list(self.links.related_objects.refs())
+        self.project.delete()
+        self.assertEqual(len(self.cache), 0)
+        self.assertListEqual(resolve_refs(refs), [self.task])
+
+    def test_rollback(self):
+        list(self.links.related_objects.all())
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                self.project.name = 'uncommitted'
+                self.project.save()
+                self.assertIn('uncommitted', [o.name for o
+                                              in self.links.related_objects
+                                                  .all()])
+                raise ValueError
+
+        self.assertIn('project', [o.name for o
+                                  in self.links.related_objects.all()])
+
+    def test_cached_on_commit(self):
+        with transaction.atomic():
+            list(self.links.related_objects.all())
+            self.assertEqual(len(self.cache), 0)
+        self.assertEqual(len(self.cache), 1)
+
+    def test_lru(self):
+        projects = [self.models.Project.objects.create() for __ in range(4)]
+        self.links.related_objects.add(*projects)
+        list(self.links.related_objects.all())
+        self.assertEqual(len(self.cache), 3)
+
+    def test_timeout(self):
+        list(self.links.related_objects.all())
+        with mock.patch('gm2m.cache.time.monotonic',
+                        return_value=10 ** 9):
+            list(self.links.related_objects.all())
+        self.assertEqual(self.cache.hits, 0)
+        self.assertEqual(self.cache.misses, 2)
+
+    def test_cached_copies(self):
+        list(self.links.related_objects.all())
+        project = list(self.links.related_objects
+                           .filter(Model=self.models.Project))[0]
+        project.name = 'altered'
+        project = list(self.links.related_objects
+                           .filter(Model=self.models.Project))[0]
+        self.assertEqual(project.name, 'project')
+
+
+class DjangoTargetCacheTests(base.TransactionTestCase):
+
+    def setUp(self):
+        self.cache = self.models.DjangoCacheLinks.related_objects.target_cache
+        self.cache.clear()
+        self.cache.reset_stats()
+
+        self.project = self.models.Project.objects.create(name='project')
+        self.links = self.models.DjangoCacheLinks.objects.create()
+        self.links.related_objects.add(self.project)
+
+    def test_cache(self):
+        list(self.links.related_objects.all())
+        with self.assertNumQueries(1):
+            self.assertListEqual(list(self.links.related_objects.all()),
+                                 [self.project])
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_invalidate(self):
+        list(self.links.related_objects.all())
+        self.project.name = 'renamed'
+        self.project.save()
+        self.assertEqual(list(self.links.related_objects.all())[0].name,
+                         'renamed')
+
+    def test_clear(self):
+        django_cache = self.cache.cache
+        django_cache.set('other', 'value')
+        list(self.links.related_objects.all())
+        self.cache.clear()
+        with self.assertNumQueries(2):
+            list(self.links.related_objects.all())
+        # the other entries of the Django cache are kept
+        self.assertEqual(django_cache.get('other'), 'value')
+
+    def test_evicted_generation(self):
+        list(self.links.related_objects.all())
+        self.cache.cache.delete(self.cache.generation_key)
+        with self.assertNumQueries(2):
+            list(self.links.related_objects.all())